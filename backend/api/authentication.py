@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from api.db import use_primary
+from backend.settings import AUTH_TOKEN_CACHE_TIMEOUT, SHARED_CACHE
+
+AUTH_TOKEN_CACHE_PREFIX = 'auth_token'
+
+
+def auth_token_cache_key(key):
+    """
+    Метод `auth_token_cache_key` возвращает ключ кэша для токена.
+    """
+    return f'{AUTH_TOKEN_CACHE_PREFIX}:{key}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Класс CachedTokenAuthentication для аутентификации по токену
+    с кэшированием пары (пользователь, токен). Пока запись в кэше
+    не устарела, запрос к таблицам токенов и пользователей
+    не выполняется. Записи удаляются из кэша при выходе из системы,
+    смене пароля, деактивации или удалении пользователя.
+    Кэш используется только общий для всех воркеров (SHARED_CACHE),
+    иначе отозванный токен принимался бы другими воркерами.
+    Токен читается из основной базы: только что выданного токена
+    может ещё не быть в репликах.
+    """
+    def authenticate_credentials(self, key):
+        """
+        Метод `authenticate_credentials` возвращает пользователя
+        и токен из кэша или из базы данных.
+        """
+        if not SHARED_CACHE:
+            with use_primary():
+                return super().authenticate_credentials(key)
+        cache_key = auth_token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            with use_primary():
+                credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, AUTH_TOKEN_CACHE_TIMEOUT)
+        return credentials
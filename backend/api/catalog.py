@@ -0,0 +1,54 @@
+import gzip
+import os
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from backend.settings import CATALOG_ROOT
+from recipes.models import Ingredient, Job, Tag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOGS = {
+    'ingredients': (Ingredient, IngredientSerializer),
+    'tags': (Tag, TagSerializer),
+}
+
+
+def write_catalog(name):
+    """
+    Функция `write_catalog` сохраняет каталог `name` в `CATALOG_ROOT`
+    в формате JSON (как в ответе API) и рядом сжатые копии `.gz`
+    и `.br`, которые nginx отдаёт без сжатия на лету.
+    Файлы заменяются атомарно.
+    """
+    model, serializer_class = CATALOGS[name]
+    content = JSONRenderer().render(serializer_class(
+        model.objects.order_by('id'), many=True
+    ).data)
+    versions = {'.json': content, '.json.gz': gzip.compress(content, 9)}
+    if brotli is not None:
+        versions['.json.br'] = brotli.compress(content, quality=11)
+    os.makedirs(CATALOG_ROOT, exist_ok=True)
+    for suffix, data in versions.items():
+        path = os.path.join(CATALOG_ROOT, name + suffix)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(path + '.tmp', path)
+    return versions
+
+
+def schedule_catalog(name):
+    """
+    Функция `schedule_catalog` после фиксации транзакции ставит
+    в очередь задачу `export_catalog`, которая перезапишет каталог
+    в фоновом воркере. Пока такая задача ожидает выполнения,
+    новые изменения её не дублируют.
+    """
+    transaction.on_commit(
+        lambda: Job.objects.enqueue_once('export_catalog', catalogs=[name])
+    )
@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+connection_stats = Counter()
+
+replica_state = threading.local()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    """
+    Функция `count_connection` учитывает каждое новое
+    подключение процесса к базе данных.
+    """
+    connection_stats[connection.alias] += 1
+    logger.info(
+        'Открыто подключение к БД %s (всего в процессе: %s)',
+        connection.alias, connection_stats[connection.alias]
+    )
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """
+    Функция `check_connections` в начале запроса проверяет
+    постоянные подключения к базе данных и закрывает оборванные,
+    чтобы запрос открыл новое подключение, а не упал с ошибкой.
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.is_usable():
+            continue
+        connection_stats[f'{connection.alias}_unusable'] += 1
+        logger.warning(
+            'Подключение к БД %s недоступно и будет открыто заново',
+            connection.alias
+        )
+        connection.close()
+
+
+@contextmanager
+def use_primary():
+    """
+    Функция `use_primary` на время блока направляет чтение
+    в основную базу, даже если запрос читает из реплики.
+    """
+    replica = getattr(replica_state, 'replica', None)
+    replica_state.replica = None
+    try:
+        yield
+    finally:
+        replica_state.replica = replica
+
+
+class ReplicaRouter:
+    """
+    Класс ReplicaRouter направляет чтение на реплику, выбранную
+    `ReplicaMiddleware` для текущего запроса, а запись и остальное
+    чтение — на основную базу. Все запросы к базе за время одного
+    HTTP-запроса читают из одной реплики. Вне запросов (команды,
+    воркеры) всё идёт в основную базу.
+    """
+    def db_for_read(self, model, **hints):
+        return getattr(replica_state, 'replica', None) or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
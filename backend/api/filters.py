@@ -1,6 +1,12 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import (Case, Count, F, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
 from django_filters import rest_framework as filter
 
-from recipes.models import Ingredient, Recipe, Tag  # isort:skip
+from backend.settings import SEARCH_CONFIG
+from recipes.models import (Ingredient, IngredientInRecipe,  # isort:skip
+                            Recipe, Tag)
 from users.models import CustomUser  # isort:skip
 
 
@@ -18,6 +24,13 @@ class IngredientFilter(filter.FilterSet):
         fields = ('name',)
 
 
+class NumberInFilter(filter.BaseInFilter, filter.NumberFilter):
+    """
+    Класс NumberInFilter для фильтрации по списку
+    чисел, перечисленных через запятую.
+    """
+
+
 class TagsFilter(filter.FilterSet):
     """
     Класс TagsFilter для фильтрации списка рецептов отмеченными тегам.
@@ -37,10 +50,20 @@ class TagsFilter(filter.FilterSet):
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filter.CharFilter(method='get_search')
+    have = NumberInFilter(method='get_have')
+    max_missing = filter.NumberFilter(method='get_max_missing')
+    ordering = filter.ChoiceFilter(
+        choices=(('popular', 'Популярные'), ('trending', 'В трендах')),
+        method='get_ordering_by'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'have', 'max_missing', 'ordering'
+        )
 
     def get_is_favorited(self, queryset, name, value):
         """
@@ -59,3 +82,84 @@ class TagsFilter(filter.FilterSet):
         if value:
             return queryset.filter(shoppingcartrecipe__user=self.request.user)
         return queryset.exclude(shoppingcartrecipe__user=self.request.user)
+
+    def get_search(self, queryset, name, value):
+        """
+        Метод `get_search` для поиска рецептов по названию, описанию
+        и ингредиентам. Результат сортируется по релевантности:
+        в PostgreSQL — полнотекстовым поиском по `tsvector`,
+        в остальных СУБД — по вхождению всех слов запроса, при этом
+        совпадения в названии выше совпадений в описании.
+        """
+        terms = value.lower().split()
+        if not terms:
+            return queryset
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(value, config=SEARCH_CONFIG)
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-pub_date')
+        condition = Q()
+        for term in terms:
+            condition &= Q(search_document__contains=term)
+        return queryset.filter(condition).annotate(
+            rank=Case(
+                When(name__icontains=value, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        ).order_by('-rank', '-pub_date')
+
+    def get_have(self, queryset, name, value):
+        """
+        Метод `get_have` для подбора рецептов по имеющимся ингредиентам.
+        Кандидаты выбираются по индексу (ingredient, recipe) таблицы
+        ингредиентов в рецепте, поэтому обходятся только рецепты,
+        содержащие хотя бы один из переданных ингредиентов. Число
+        имеющихся ингредиентов (`have_count`) считается для каждого
+        кандидата отдельным запросом по индексу (recipe, ingredient),
+        а число недостающих (`missing_count`) — вычитанием из хранимого
+        в рецепте числа ингредиентов. Результат сортируется сначала
+        по числу имеющихся, затем по числу недостающих ингредиентов.
+        """
+        ingredient_ids = [int(ingredient_id) for ingredient_id in value]
+        if not ingredient_ids:
+            return queryset
+        have = IngredientInRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids
+        )
+        have_count = have.filter(recipe=OuterRef('pk')).values(
+            'recipe'
+        ).annotate(count=Count('id')).values('count')
+        return queryset.filter(
+            id__in=have.values('recipe_id')
+        ).annotate(
+            have_count=Subquery(have_count, output_field=IntegerField()),
+            missing_count=F('ingredient_count') - F('have_count')
+        ).order_by('-have_count', 'missing_count', '-pub_date')
+
+    def get_max_missing(self, queryset, name, value):
+        """
+        Метод `get_max_missing` оставляет рецепты, в которых
+        недостает не больше заданного числа ингредиентов.
+        Применяется вместе с параметром `have`. Рецепты, в которых
+        ингредиентов больше, чем переданных и допустимых недостающих
+        вместе, отсекаются по хранимому числу ингредиентов без
+        подсчёта имеющихся.
+        """
+        if 'missing_count' not in queryset.query.annotations:
+            return queryset
+        have = self.form.cleaned_data.get('have') or ()
+        return queryset.filter(
+            ingredient_count__lte=len(set(have)) + value,
+            missing_count__lte=value
+        )
+
+    def get_ordering_by(self, queryset, name, value):
+        """
+        Метод `get_ordering_by` для сортировки рецептов по популярности
+        (`popular`) или по рейтингу в трендах (`trending`).
+        Оба значения хранятся в проиндексированных полях рецепта.
+        """
+        field = {'popular': 'popularity', 'trending': 'trending'}[value]
+        return queryset.order_by(f'-{field}', '-pub_date')
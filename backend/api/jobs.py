@@ -0,0 +1,65 @@
+from django.core.management import call_command
+
+from api.util import shopping_cart_pdf
+from backend.settings import FILENAME
+from recipes.models import ShoppingListItem
+
+TASKS = {}
+
+
+def task(name):
+    """
+    Декоратор `task` регистрирует функцию как фоновую задачу `name`.
+    Функция получает объект `Job`, её аргументы —
+    `job.get_arguments()`.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+@task('shopping_cart_pdf')
+def render_shopping_cart(job):
+    """
+    Задача `shopping_cart_pdf` формирует pdf-файл
+    списка покупок пользователя.
+    """
+    data = ShoppingListItem.objects.totals(job.user)
+    job.set_progress(50)
+    job.save_result(f'{FILENAME}.pdf', shopping_cart_pdf(data).getvalue())
+
+
+@task('import_recipes')
+def import_recipes(job):
+    """
+    Задача `import_recipes` импортирует рецепты из файла
+    командой `import_recipes`.
+    """
+    call_command('import_recipes', **job.get_arguments())
+
+
+@task('compact_recipe_scores')
+def compact_recipe_scores(job):
+    """
+    Задача `compact_recipe_scores` пересчитывает рейтинги рецептов.
+    """
+    call_command('compact_recipe_scores', **job.get_arguments())
+
+
+@task('export_catalog')
+def export_catalog(job):
+    """
+    Задача `export_catalog` перезаписывает снимки каталогов
+    со сжатыми копиями.
+    """
+    call_command('export_catalog', *job.get_arguments().get('catalogs', ()))
+
+
+@task('rebuild_shopping_lists')
+def rebuild_shopping_lists(job):
+    """
+    Задача `rebuild_shopping_lists` пересчитывает
+    сводные списки покупок.
+    """
+    call_command('rebuild_shopping_lists')
@@ -0,0 +1,209 @@
+import cProfile
+import hashlib
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string, slugify
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from api.db import replica_state
+from api.profiling import save_profile
+from backend.settings import (COMPRESSION_MIN_SIZE, COMPRESSION_TYPES,
+                              DB_REPLICA_PIN_SECONDS, DB_REPLICAS,
+                              PROFILING_ENABLED, SHARED_CACHE)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+BROTLI_QUALITY = 5
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ProfilingMiddleware:
+    """
+    Класс ProfilingMiddleware выполняет запрос под cProfile, если
+    сотрудник (is_staff) передал заголовок `X-Profile` или параметр
+    `profile`, и сохраняет профиль командой `save_profile`. Имя
+    профиля возвращается в заголовке `X-Profile-Id`. Пока
+    `PROFILING_ENABLED` выключен, middleware исключается из цепочки
+    при запуске и не влияет на запросы.
+    """
+    def __init__(self, get_response):
+        if not PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (
+            'HTTP_X_PROFILE' in request.META or 'profile' in request.GET
+        ) or not self.is_staff(request):
+            return self.get_response(request)
+        if 'profile' in request.GET:
+            request.GET = request.GET.copy()
+            del request.GET['profile']
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        elapsed = round((time.perf_counter() - started) * 1000)
+        name = '{}-{}-{}-{}ms'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            request.method,
+            slugify(request.path.replace('/', '-')).strip('-')[:80]
+            or 'root',
+            elapsed
+        )
+        save_profile(profiler, name)
+        response['X-Profile-Id'] = name
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        """
+        Метод `is_staff` проверяет, что запрос отправил сотрудник:
+        по сессии (админ-зона) или по токену API.
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        try:
+            credentials = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return credentials is not None and credentials[0].is_staff
+
+
+class CompressionMiddleware:
+    """
+    Класс CompressionMiddleware сжимает ответы API в brotli
+    (если установлен пакет Brotli и клиент его принимает) или gzip.
+    Сжимаются только типы из `COMPRESSION_TYPES` размером не меньше
+    `COMPRESSION_MIN_SIZE` байт: на маленьких ответах сжатие
+    не окупает затраченное время. Потоковые ответы (pdf-файлы)
+    не сжимаются.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < COMPRESSION_MIN_SIZE
+            or response.get('Content-Type', '').split(';')[0]
+            not in COMPRESSION_TYPES
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and ACCEPTS_BROTLI.search(accept_encoding):
+            content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            encoding = 'br'
+        elif ACCEPTS_GZIP.search(accept_encoding):
+            content = compress_string(response.content)
+            encoding = 'gzip'
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Класс RateLimitHeadersMiddleware добавляет в ответ заголовки
+    `X-RateLimit-*` с лимитом запросов, установленным
+    `SlidingWindowThrottle`.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        for header, value in getattr(request, 'rate_limit', {}).items():
+            response[header] = str(value)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Класс ReplicaMiddleware на время безопасного (GET, HEAD, OPTIONS)
+    запроса выбирает одну из реплик, из которой `ReplicaRouter`
+    читает все данные этого запроса.
+    После запроса, изменяющего данные, клиент на
+    `DB_REPLICA_PIN_SECONDS` секунд закрепляется за основной базой,
+    чтобы сразу видеть свои изменения, пока реплики их догоняют.
+    Клиент определяется по токену, сессии или IP-адресу. Закрепление
+    хранится в кэше, поэтому с репликами нужен общий для всех
+    воркеров кэш.
+    """
+    def __init__(self, get_response):
+        if DB_REPLICAS and not SHARED_CACHE:
+            raise ImproperlyConfigured(
+                'Для DB_REPLICAS нужен общий кэш (CACHE_BACKEND).'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not DB_REPLICAS:
+            return self.get_response(request)
+        safe = request.method in SAFE_METHODS
+        if safe and not cache.get_many(self.get_pin_keys(request)):
+            replica_state.replica = random.choice(DB_REPLICAS)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            replica_state.replica = None
+            if not safe:
+                cache.set_many(
+                    dict.fromkeys(self.get_pin_keys(request, response), True),
+                    DB_REPLICA_PIN_SECONDS
+                )
+
+    @staticmethod
+    def get_pin_keys(request, response=None):
+        """
+        Метод `get_pin_keys` возвращает ключи кэша, по которым
+        клиент закрепляется за основной базой: хэши токена и сессии
+        (в том числе новой, выданной при входе), а без них — хэш
+        IP-адреса клиента. За прокси берётся адрес, который прокси
+        добавил последним в X-Forwarded-For.
+        """
+        idents = [
+            request.META.get('HTTP_AUTHORIZATION'),
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+        ]
+        if response is not None and settings.SESSION_COOKIE_NAME in (
+            response.cookies
+        ):
+            idents.append(
+                response.cookies[settings.SESSION_COOKIE_NAME].value
+            )
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        idents = [ident for ident in idents if ident] or [
+            forwarded_for.rsplit(',', 1)[-1].strip()
+            or request.META.get('REMOTE_ADDR', '')
+        ]
+        return [
+            'db_pin:' + hashlib.sha256(ident.encode()).hexdigest()
+            for ident in idents
+        ]
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from backend.settings import PAGE_SIZE
 
@@ -9,3 +9,14 @@ class RecipePagination(PageNumberPagination):
     """
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class FeedPagination(CursorPagination):
+    """
+    Класс FeedPagination для постраничного вывода ленты рецептов
+    по курсору: следующая страница выбирается по дате публикации
+    последнего рецепта, а не через OFFSET.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
@@ -0,0 +1,75 @@
+import os
+import pstats
+from collections import defaultdict
+
+from backend.settings import PROFILE_ROOT
+
+MAX_DEPTH = 128
+MIN_MICROSECONDS = 1
+
+
+def function_label(func):
+    """
+    Функция `function_label` возвращает подпись функции
+    для свёрнутых стеков: `модуль:строка(функция)`.
+    """
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{line}({name})'
+
+
+def collapse_stats(stats):
+    """
+    Функция `collapse_stats` строит из статистики cProfile свёрнутые
+    стеки для flamegraph.pl/speedscope: строки `a;b;c <мкс>`.
+    cProfile хранит только пары «вызывающая — вызываемая функция»,
+    поэтому время вызываемой функции делится между путями
+    пропорционально времени вызовов из каждой вызывающей функции.
+    Корни стеков — функции, вызванные из кадров, начатых до включения
+    профилировщика.
+    """
+    stats = stats.stats
+    children = defaultdict(dict)
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            children[caller][func] = edge[3]
+    stacks = defaultdict(float)
+
+    def walk(func, path, share):
+        tt, ct = stats[func][2:4]
+        path = path + (function_label(func),)
+        stacks[';'.join(path)] += tt * share * 1000000
+        if len(path) >= MAX_DEPTH:
+            return
+        for child, edge_time in children[func].items():
+            child_time = stats[child][3]
+            child_share = share * edge_time / child_time if child_time else 0
+            if (
+                function_label(child) not in path
+                and child_time * child_share * 1000000 >= MIN_MICROSECONDS
+            ):
+                walk(child, path, child_share)
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if sum(edge[0] for edge in callers.values()) < nc:
+            walk(func, (), 1.0)
+    return '\n'.join(
+        f'{stack} {round(time)}'
+        for stack, time in sorted(stacks.items())
+        if round(time) > 0
+    )
+
+
+def save_profile(profiler, name):
+    """
+    Функция `save_profile` сохраняет профиль запроса в `PROFILE_ROOT`:
+    `<name>.prof` для pstats/snakeviz и `<name>.collapsed`
+    со свёрнутыми стеками.
+    """
+    os.makedirs(PROFILE_ROOT, exist_ok=True)
+    path = os.path.join(PROFILE_ROOT, name)
+    profiler.dump_stats(f'{path}.prof')
+    with open(f'{path}.collapsed', 'w', encoding='utf8') as file:
+        file.write(collapse_stats(pstats.Stats(profiler)))
+    return path
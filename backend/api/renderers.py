@@ -0,0 +1,42 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Класс FastJSONRenderer для сериализации ответов в JSON с помощью orjson.
+    Вывод побайтно совпадает с `JSONRenderer`: компактные разделители,
+    UTF-8 без экранирования и экранирование символов \\u2028 и \\u2029.
+    Если orjson не установлен, запрошен отступ (браузерный API) или данные
+    не поддерживаются orjson, используется стандартный `JSONRenderer`.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Метод `render` возвращает JSON-представление данных в байтах.
+        """
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
@@ -1,13 +1,15 @@
 from django.core.validators import MinValueValidator
 from django.db import transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from backend.settings import AMOUNT_INGREDIENT, COOKING_TIME_RECIPE
-from recipes.models import (FavoriteList, Ingredient,
-                            IngredientInRecipe, Recipe, ShoppingCart,
+from recipes.models import (FavoriteList, Ingredient, IngredientInRecipe,
+                            Job, Recipe, ShoppingCart, ShoppingListItem,
                             Subscription, Tag)
 from users.models import CustomUser
 from users.serializers import CurrentCustomUserSerializer
@@ -134,7 +136,24 @@ class TagSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор RecipeSerializer для модели Recipe.
+    Если в контексте передан `sparse_fields` (пара множеств
+    `fields` и `expand`), выводятся только поля из `fields`,
+    а вложенные объекты не из `expand` заменяются их id.
     """
+    COLLAPSED_FIELDS = {
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+        'author': lambda: serializers.PrimaryKeyRelatedField(
+            read_only=True
+        ),
+        'ingredients': lambda: serializers.SlugRelatedField(
+            source='ingredientinrecipe',
+            slug_field='ingredient_id',
+            many=True,
+            read_only=True
+        ),
+    }
     tags = TagSerializer(many=True)
     author = AuthorSerializer(default=CurrentCustomUserSerializer())
     ingredients = IngredientInRecipeSerializer(
@@ -172,11 +191,26 @@ class RecipeSerializer(serializers.ModelSerializer):
             ),
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        sparse_fields = self.context.get('sparse_fields')
+        if sparse_fields is None:
+            return
+        fields, expand = sparse_fields
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        for name, field in self.COLLAPSED_FIELDS.items():
+            if name in self.fields and name not in expand:
+                self.fields[name] = field()
+
     def ingredint_in_recipe_bulk_create(self, ingredients, recipe):
         """
         Метод 'ingredint_in_recipe_bulk_create' создаёт
         ингредиенты для рецепта в базе данных одним запросом
-        с помощью метода 'bulk_create'.
+        с помощью метода 'bulk_create'. Число ингредиентов
+        рецепта увеличивается тем же числом строк: 'bulk_create'
+        не отправляет сигналов.
         """
         ingredients_in_recipe = [
             IngredientInRecipe(
@@ -186,6 +220,9 @@ class RecipeSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients
         ]
         IngredientInRecipe.objects.bulk_create(ingredients_in_recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            ingredient_count=F('ingredient_count') + len(ingredients_in_recipe)
+        )
 
     def get_is_favorited(self, obj):
         """
@@ -195,6 +232,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         request = self.context['request']
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         return FavoriteList.objects.filter(
             user=request.user, recipe=obj).exists()
 
@@ -206,6 +245,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         return ShoppingCart.objects.filter(
             user=request.user, recipe=obj).exists()
 
@@ -221,13 +262,19 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         self.ingredint_in_recipe_bulk_create(
             ingredients=ingredients, recipe=recipe)
+        recipe.update_search_document(
+            ingredient['id'].name for ingredient in ingredients
+        )
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         """
-        Метод `update` редактирует рецепт.
+        Метод `update` редактирует рецепт. Если рецепт добавлен
+        в списки покупок, сводные списки пользователей пересчитываются
+        на разницу между старыми и новыми ингредиентами.
         """
+        ShoppingListItem.objects.remove_recipe(instance)
         IngredientInRecipe.objects.filter(recipe=instance).delete()
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredientinrecipe')
@@ -236,9 +283,16 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         self.ingredint_in_recipe_bulk_create(
             ingredients=ingredients, recipe=instance)
+        ShoppingListItem.objects.add_recipe(instance)
 
         instance.refresh_from_db()
-        return super().update(instance=instance, validated_data=validated_data)
+        recipe = super().update(
+            instance=instance, validated_data=validated_data
+        )
+        recipe.update_search_document(
+            ingredient['id'].name for ingredient in ingredients
+        )
+        return recipe
 
     def validate(self, data):
         """Валидация ингредиентов и количества."""
@@ -269,6 +323,77 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
 
+class ShoppingCartSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор ShoppingCartSerializer для модели ShoppingCart
+    (число порций рецепта в списке покупок).
+    """
+    class Meta:
+        model = ShoppingCart
+        fields = ('multiplier',)
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """
+    Сериализатор ShoppingListSerializer для строк сводного
+    списка покупок.
+    """
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.DecimalField(
+        source='total',
+        max_digits=14,
+        decimal_places=2,
+        coerce_to_string=False
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор JobSerializer для модели Job (статус фоновой задачи).
+    Ссылка на результат появляется после выполнения задачи.
+    """
+    result = serializers.SerializerMethodField(method_name='get_result')
+
+    class Meta:
+        model = Job
+        fields = ('id', 'task', 'status', 'progress', 'result', 'created_at')
+
+    def get_result(self, obj):
+        """
+        Метод `get_result` возвращает ссылку на файл результата.
+        """
+        if obj.status != Job.DONE or not obj.result:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('job-result', args=(obj.pk,))
+        )
+
+
+class SyncFavoriteSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор SyncFavoriteSerializer для синхронизации
+    избранного (id рецепта).
+    """
+    id = serializers.ReadOnlyField(source='recipe_id')
+
+    class Meta:
+        model = FavoriteList
+        fields = ('id',)
+
+
+class SyncShoppingCartSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор SyncShoppingCartSerializer для синхронизации
+    списка покупок (id рецепта и число порций).
+    """
+    id = serializers.ReadOnlyField(source='recipe_id')
+
+    class Meta:
+        model = ShoppingCart
+        fields = ('id', 'multiplier')
+
+
 class SubscriptionRecipesSerializer(RecipeSerializer):
     """
     Сериализатор SubscriptionRecipesSerializer для модели Recipe.
@@ -296,7 +421,9 @@ class SubscribtionSerializer(serializers.ModelSerializer):
         method_name='get_is_subscribed'
     )
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.ReadOnlyField(source='author.recipes.count')
+    recipes_count = serializers.SerializerMethodField(
+        method_name='get_recipes_count'
+    )
 
     class Meta:
         fields = (
@@ -318,6 +445,8 @@ class SubscribtionSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if obj.pk is not None and obj.user_id == request.user.id:
+            return True
         return Subscription.objects.filter(
             user=request.user, author=obj.author
         ).exists()
@@ -338,29 +467,13 @@ class SubscribtionSerializer(serializers.ModelSerializer):
             queryset, many=True
         ).data
 
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscription
-        fields = ('id', 'user', 'author')
-        validators = (
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author')
-            ),
-        )
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        serializer = SubscribtionSerializer(
-            instance,
-            context=context
-        )
-        return serializer.data
-
-    def validate_author(self, value):
-        if self.context.get('request').user == value:
-            raise serializers.ValidationError(
-                'Вы не можете подписаться на самого себя!')
-        return value
+    def get_recipes_count(self, obj):
+        """
+        Метод `get_recipes_count` возвращает число рецептов автора,
+        если оно уже посчитано в запросе (`recipes_count`), или
+        считает его отдельным запросом.
+        """
+        recipes_count = getattr(obj.author, 'recipes_count', None)
+        if recipes_count is None:
+            return obj.author.recipes.count()
+        return recipes_count
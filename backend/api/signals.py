@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import auth_token_cache_key
+from api.catalog import schedule_catalog
+from recipes.models import Ingredient, Tag
+from users.models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Функция `token_deleted` удаляет токен из кэша
+    при выходе пользователя из системы.
+    """
+    cache.delete(auth_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, created, **kwargs):
+    """
+    Функция `user_changed` удаляет из кэша токены пользователя
+    при смене пароля, деактивации и других изменениях,
+    чтобы следующий запрос получил актуальные данные.
+    """
+    if created:
+        return
+    cache.delete_many([
+        auth_token_cache_key(key) for key in Token.objects.filter(
+            user=instance
+        ).values_list('key', flat=True)
+    ])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """
+    Функция `ingredient_changed` ставит в очередь обновление
+    снимка каталога ингредиентов.
+    """
+    schedule_catalog('ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    """
+    Функция `tag_changed` ставит в очередь обновление
+    снимка каталога тэгов.
+    """
+    schedule_catalog('tags')
@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from backend.settings import THROTTLE_SCOPES
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Класс SlidingWindowThrottle для ограничения частоты запросов.
+    Область ограничения (scope) определяется по представлению
+    и действию из настройки `THROTTLE_SCOPES`, лимиты — по
+    `DEFAULT_THROTTLE_RATES`. Число запросов оценивается скользящим
+    окном по двум счётчикам в кэше — текущего и предыдущего окна,
+    поэтому пропущенный запрос стоит одно увеличение счётчика
+    и одно чтение независимо от лимита; отклонённый — ещё одно
+    уменьшение счётчика. Сведения о лимите сохраняются в запросе
+    и выводятся в заголовках ответа `RateLimitHeadersMiddleware`.
+    """
+    cache = cache
+    cache_format = 'throttle:%(scope)s:%(ident)s:%(window)s'
+
+    def __init__(self):
+        pass
+
+    def get_scope(self, view):
+        """
+        Метод `get_scope` возвращает область ограничения
+        для представления и его действия.
+        """
+        name = view.__class__.__name__
+        action = getattr(view, 'action', None)
+        return THROTTLE_SCOPES.get(f'{name}.{action}') or THROTTLE_SCOPES.get(
+            name
+        )
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user{request.user.pk}'
+        return f'ip{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        """
+        Метод `allow_request` учитывает запрос и возвращает False,
+        если лимит для области ограничения исчерпан.
+        """
+        self.scope = self.get_scope(view)
+        if self.scope is None or self.scope not in self.THROTTLE_RATES:
+            return True
+        self.num_requests, self.duration = self.parse_rate(
+            self.THROTTLE_RATES[self.scope]
+        )
+        ident = self.get_cache_key(request, view)
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        current_key, previous_key = (
+            self.cache_format % {
+                'scope': self.scope, 'ident': ident, 'window': number
+            } for number in (window, window - 1)
+        )
+        self.current = self.increment(current_key)
+        self.previous = self.cache.get(previous_key, 0)
+        allowed = self.estimate() <= self.num_requests
+        if not allowed:
+            self.cache.decr(current_key)
+            self.current -= 1
+        request._request.rate_limit = {
+            'X-RateLimit-Limit': self.num_requests,
+            'X-RateLimit-Remaining': max(
+                0, int(self.num_requests - self.estimate())
+            ),
+            'X-RateLimit-Reset': int(self.duration - self.elapsed) or 1,
+        }
+        return allowed
+
+    def estimate(self):
+        """
+        Метод `estimate` возвращает оценку числа запросов
+        за последнее окно длиной `duration`.
+        """
+        weight = (self.duration - self.elapsed) / self.duration
+        return self.previous * weight + self.current
+
+    def increment(self, key):
+        """
+        Метод `increment` увеличивает счётчик окна и возвращает его
+        значение. Счётчик создаётся только при первом запросе окна
+        и хранится два окна, чтобы оставаться предыдущим
+        для следующего окна.
+        """
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, self.duration * 2):
+                return 1
+            return self.cache.incr(key)
+
+    def wait(self):
+        """
+        Метод `wait` возвращает число секунд до момента,
+        когда оценка опустится ниже лимита.
+        """
+        window_left = self.duration - self.elapsed
+        if self.current >= self.num_requests or not self.previous:
+            return window_left
+        excess = self.estimate() - self.num_requests + 1
+        return min(window_left, excess * self.duration / self.previous)
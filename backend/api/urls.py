@@ -26,6 +26,14 @@ router.register(r'users/(?P<id>\d+)/subscribe',
                 views.SubscribeViewSet,
                 basename='subscribe'
                 )
+router.register('jobs',
+                views.JobViewSet,
+                basename='job'
+                )
+router.register('sync',
+                views.SyncViewSet,
+                basename='sync'
+                )
 
 
 urlpatterns = [
@@ -1,11 +1,35 @@
 import io
 from datetime import datetime
+from decimal import Decimal
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from backend.settings import BASE_DIR
+
+FONT_NAME = 'Vela Sans'
+FONT_PATH = BASE_DIR / 'data' / 'Vela Sans.ttf'
+
+
+def register_font():
+    """
+    Метод `register_font` один раз на процесс регистрирует
+    шрифт для pdf-файлов, чтобы не разбирать ttf-файл
+    при каждом скачивании списка покупок.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_PATH)))
+
+
+def format_amount(amount):
+    """
+    Метод `format_amount` возвращает количество ингредиента
+    без лишних нулей в дробной части.
+    """
+    return f'{Decimal(amount).normalize():f}'
+
 
 def shopping_cart_pdf(data):
     """
@@ -14,24 +38,24 @@ def shopping_cart_pdf(data):
     """
     buffer = io.BytesIO()
     sh = canvas.Canvas(buffer, pagesize=A4)
-    pdfmetrics.registerFont(TTFont('Vela Sans', 'data/Vela Sans.ttf'))
+    register_font()
     sh.setFillColorCMYK(0.4, 0, 0.4, 0.2)
-    sh.setFont('Vela Sans', 16)
+    sh.setFont(FONT_NAME, 16)
     today = datetime.now()
     sh.drawString(
         220,
         750,
         f'Shopping list {today.strftime("%d")} {today.strftime("%B")}'
     )
-    sh.setFont('Vela Sans', 12)
+    sh.setFont(FONT_NAME, 12)
     sh.setFillColorRGB(0, 0, 0)
     textobject = sh.beginText()
     textobject.setTextOrigin(20, 700)
     for number, item in enumerate(data, start=1):
         textobject.textLine(
-            f'{number}.  {item["ingredient__name"]} - '
-            f'{item["ingredient_total"]}'
-            f' {item["ingredient__measurement_unit"]}'
+            f'{number}.  {item["name"]} - '
+            f'{format_amount(item["total"])}'
+            f' {item["measurement_unit"]}'
         )
         textobject.moveCursor(0, 2)
     sh.drawText(textobject)
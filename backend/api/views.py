@@ -1,26 +1,44 @@
+import base64
+import json
+from datetime import timedelta
 from http import HTTPStatus
 
-from django.db.models import Sum
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+                                        IsAuthenticated)
 from rest_framework.response import Response
 
 from api.filters import IngredientFilter, TagsFilter
-from api.pagination import RecipePagination
+from api.pagination import FeedPagination, RecipePagination
 from api.permissions import AuthorOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeSerializer,
-                          SubscribeSerializer, SubscribtionSerializer,
-                          SubscriptionRecipesSerializer, TagSerializer)
+from api.serializers import (IngredientSerializer, JobSerializer,
+                             RecipeSerializer,
+                             ShoppingCartSerializer, ShoppingListSerializer,
+                             SubscribtionSerializer,
+                             SubscriptionRecipesSerializer,
+                             SyncFavoriteSerializer,
+                             SyncShoppingCartSerializer, TagSerializer)
 from api.util import shopping_cart_pdf
-from backend.settings import FILENAME
-from recipes.models import (FavoriteList, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Subscription, Tag)
+from backend.settings import (BATCH_SIZE, FILENAME, SHARED_CACHE,
+                              SYNC_PAGE_SIZE, SYNC_TOMBSTONE_DAYS)
+from recipes.models import (FavoriteList, Ingredient, Job, Recipe,
+                            ShoppingCart, ShoppingListItem, Subscription, Tag,
+                            Tombstone)
+from recipes.tag_index import tag_recipe_ids
 from users.models import CustomUser
 
+TAG_INDEX_PARAMS = {'tags', 'page', 'limit', 'fields', 'expand'}
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -49,17 +67,152 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ViewSet для отображения списка или одного рецепта,
     редактирования, обновления и удаления рецепта. Для
     добавления или удаления рецепта в избранное или список покупок.
+    Параметры `fields` и `expand` ограничивают поля ответа
+    и вложенные объекты, а вместе с ними и запросы к базе.
+    Параметр `ids` возвращает рецепты по списку id.
     """
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_document', 'search_vector')
     serializer_class = RecipeSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TagsFilter
 
+    def get_sparse_fields(self):
+        """
+        Метод `get_sparse_fields` возвращает множества полей
+        из параметров `fields` и `expand` или None, если параметры
+        не переданы. Без `fields` выводятся все поля.
+        """
+        params = self.request.query_params
+        if self.request.method not in SAFE_METHODS or not (
+            'fields' in params or 'expand' in params
+        ):
+            return None
+        fields = params.get('fields')
+        return (
+            set(fields.split(',')) if fields else None,
+            set(params.get('expand', '').split(','))
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def get_queryset(self):
+        """
+        Метод `get_queryset` подгружает только те связанные объекты
+        и признаки, которые попадут в ответ.
+        """
+        queryset = super().get_queryset()
+        fields, expand = self.get_sparse_fields() or (
+            None, set(RecipeSerializer.COLLAPSED_FIELDS)
+        )
+
+        def wanted(name):
+            return fields is None or name in fields
+
+        if wanted('author') and 'author' in expand:
+            queryset = queryset.select_related('author')
+        if wanted('tags'):
+            queryset = queryset.prefetch_related('tags')
+        if wanted('ingredients'):
+            queryset = queryset.prefetch_related(
+                'ingredientinrecipe__ingredient'
+                if 'ingredients' in expand else 'ingredientinrecipe'
+            )
+        if not wanted('text'):
+            queryset = queryset.defer('text')
+        user = self.request.user
+        annotations = {}
+        if user.is_authenticated:
+            if wanted('is_favorited'):
+                annotations['favorited'] = Exists(
+                    FavoriteList.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                )
+            if wanted('is_in_shopping_cart'):
+                annotations['in_shopping_cart'] = Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                )
+        return queryset.annotate(**annotations)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        if 'ids' in params:
+            return self.batch(request)
+        if (
+            SHARED_CACHE and 'tags' in params
+            and set(params) <= TAG_INDEX_PARAMS
+        ):
+            response = self.list_by_tags(params.getlist('tags'))
+            if response is not None:
+                return response
+        return super().list(request, *args, **kwargs)
+
+    def list_by_tags(self, slugs):
+        """
+        Метод `list_by_tags` выводит рецепты с любым из тэгов `slugs`
+        по кэшированному списку id рецептов этих тэгов: страница
+        выбирается без запроса к базе, из базы загружаются только
+        рецепты страницы. Используется только с общим кэшем: сброс
+        индекса в кэше процесса не виден другим воркерам. Для
+        неизвестных тэгов и списка, который не удалось сохранить
+        в кэш, возвращается None, и запрос обрабатывается фильтром
+        как обычно.
+        """
+        tag_ids = list(Tag.objects.filter(slug__in=slugs).values_list(
+            'id', flat=True
+        ))
+        if len(tag_ids) != len(set(slugs)):
+            return None
+        recipe_ids = tag_recipe_ids(tag_ids)
+        if recipe_ids is None:
+            return None
+        page = self.paginate_queryset(recipe_ids)
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[id] for id in page if id in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def batch(self, request):
+        """
+        Метод `batch` возвращает рецепты из параметра `ids`
+        в порядке запроса одним запросом к базе. Ненайденные id
+        перечисляются в `missing`.
+        """
+        try:
+            ids = list(dict.fromkeys(
+                int(id) for id in request.query_params['ids'].split(',')
+            ))
+        except ValueError:
+            raise ValidationError(
+                {'ids': 'Ожидается список id через запятую.'}
+            )
+        if len(ids) > BATCH_SIZE:
+            raise ValidationError(
+                {'ids': f'Не больше {BATCH_SIZE} рецептов за запрос.'}
+            )
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[id] for id in ids if id in recipes], many=True
+        )
+        return Response(
+            data={
+                'results': serializer.data,
+                'missing': [id for id in ids if id not in recipes],
+            },
+            status=HTTPStatus.OK
+        )
+
     @action(
         detail=True,
         methods=('post', 'delete'),
@@ -76,17 +229,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=True,
-        methods=('post', 'delete'),
+        methods=('post', 'patch', 'delete'),
         permission_classes=(IsAuthenticated,)
     )
     def shopping_cart(self, request, pk):
         """
         Метод `shopping_cart` вызывает метод добавления или удаления рецепта
-        из списка покупок.
+        из списка покупок или изменения числа его порций.
         """
-        if request.method == 'POST':
-            return self.add_recipe(ShoppingCart, request, pk)
-        return self.delete_recipe(ShoppingCart, request, pk)
+        if request.method == 'DELETE':
+            return self.delete_recipe(ShoppingCart, request, pk)
+        serializer = ShoppingCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if request.method == 'PATCH':
+            return self.update_servings(
+                request, pk, serializer.validated_data.get('multiplier')
+            )
+        return self.add_recipe(
+            ShoppingCart, request, pk, **serializer.validated_data
+        )
 
     @action(
         detail=False,
@@ -96,17 +257,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Метод `download_shopping_cart` выгружает pdf-файл
         с перечнем и количеством необходимых ингредиентов
-        для рецептов из "Списка покупок".
+        для рецептов из "Списка покупок". С параметром `async`
+        файл формируется фоновой задачей, а в ответе возвращается
+        ссылка для проверки её статуса.
         """
-        result = IngredientInRecipe.objects.filter(
-            recipe__shoppingcartrecipe__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by(
-            'ingredient__name'
-        ).annotate(
-            ingredient_total=Sum('amount')
-        )
+        if 'async' in request.query_params:
+            job = Job.objects.enqueue('shopping_cart_pdf', user=request.user)
+            serializer = JobSerializer(job, context={'request': request})
+            return Response(
+                data={
+                    **serializer.data,
+                    'url': request.build_absolute_uri(
+                        reverse('job-detail', args=(job.pk,))
+                    ),
+                },
+                status=HTTPStatus.ACCEPTED
+            )
+        result = ShoppingListItem.objects.totals(request.user)
         file = shopping_cart_pdf(result)
         return FileResponse(
             file,
@@ -116,7 +283,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=HTTPStatus.OK
         )
 
-    def add_recipe(self, model, request, pk):
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Метод `feed` возвращает ленту новых рецептов авторов,
+        на которых подписан пользователь. Рецепты выбираются одним
+        запросом по индексу (author, pub_date) и выводятся
+        постранично по курсору.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Subscription.objects.filter(
+                user=request.user
+            ).values('author')
+        )
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request):
+        """
+        Метод `shopping_list` возвращает сводный список покупок
+        с количеством необходимых ингредиентов в формате JSON.
+        """
+        serializer = ShoppingListSerializer(
+            ShoppingListItem.objects.totals(request.user), many=True
+        )
+        return Response(data=serializer.data, status=HTTPStatus.OK)
+
+    @transaction.atomic
+    def add_recipe(self, model, request, pk, **fields):
         """
         Метод `add_recipe` добавляет рецепт
         в список избранного или список покупок.
@@ -124,10 +328,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
         if model.objects.filter(recipe=recipe, user=request.user).exists():
             return Response(status=HTTPStatus.BAD_REQUEST)
-        model.objects.create(recipe=recipe, user=request.user)
+        model.objects.create(recipe=recipe, user=request.user, **fields)
         serializer = SubscriptionRecipesSerializer(recipe)
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
+    @transaction.atomic
+    def update_servings(self, request, pk, multiplier=None):
+        """
+        Метод `update_servings` изменяет число порций рецепта
+        в списке покупок. Без `multiplier` число порций не меняется.
+        """
+        cart = get_object_or_404(
+            ShoppingCart.objects.select_related('recipe'),
+            user=request.user,
+            recipe_id=pk
+        )
+        if multiplier is not None:
+            cart.multiplier = multiplier
+            cart.save(update_fields=('multiplier', 'updated_at'))
+        serializer = SubscriptionRecipesSerializer(cart.recipe)
+        return Response(data=serializer.data, status=HTTPStatus.OK)
+
+    @transaction.atomic
     def delete_recipe(self, model, request, pk):
         """
         Метод `delete_recipe` удаляет рецепт
@@ -165,26 +387,232 @@ class SubscribeViewSet(viewsets.ModelViewSet):
 
     def create(self, request, id):
         """
-        Метод `create` создает подписку на автора.
+        Метод `create` создает подписку на автора. Автор читается
+        сразу с числом рецептов, подписка записывается одним INSERT,
+        а повторная подписка определяется по уникальному ограничению
+        без предварительной проверки.
         """
-        author = get_object_or_404(CustomUser, id=id)
-        user = self.request.user
-        data = {'author': author.id, 'user': user.id}
-        serializer = SubscribeSerializer(
-            data=data, context={'request': request}
+        author = get_object_or_404(
+            CustomUser.objects.annotate(recipes_count=Count('recipes')),
+            id=id
+        )
+        if author == request.user:
+            raise ValidationError(
+                {'author': ['Вы не можете подписаться на самого себя!']}
+            )
+        subscription = Subscription(user=request.user, author=author)
+        try:
+            with transaction.atomic():
+                subscription.save(force_insert=True)
+        except IntegrityError:
+            raise ValidationError(
+                {'non_field_errors': ['Вы уже подписаны на этого автора.']}
+            )
+        serializer = SubscribtionSerializer(
+            subscription, context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
     def delete(self, request, id):
         """
-        Метод `delete` удаляет подписку на автора.
+        Метод `delete` удаляет подписку на автора одним запросом.
+        """
+        deleted, _ = Subscription.objects.filter(
+            user=request.user, author_id=id
+        ).delete()
+        if not deleted:
+            raise NotFound
+        return Response(status=HTTPStatus.NO_CONTENT)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для отображения статуса фоновых задач пользователя
+    и выгрузки их результатов.
+    """
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """
+        Метод `get_queryset` читает задачи из основной базы:
+        задача создаётся GET-запросом, а ход выполнения пишет воркер,
+        поэтому реплики могут отставать.
+        """
+        return self.request.user.jobs.using('default').order_by('-id')
+
+    @action(detail=True)
+    def result(self, request, pk=None):
+        """
+        Метод `result` выгружает файл результата выполненной задачи.
+        """
+        job = get_object_or_404(
+            self.get_queryset(), pk=pk, status=Job.DONE
+        )
+        if not job.result:
+            raise NotFound
+        return FileResponse(
+            job.result.open('rb'),
+            as_attachment=True,
+            filename=job.result.name.split('-', 1)[-1],
+            status=HTTPStatus.OK
+        )
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    ViewSet для синхронизации клиентов: возвращает объекты,
+    изменённые после позиции из параметра `since`, и id удалённых
+    объектов. Каждая коллекция читается по индексу (updated_at, id)
+    не больше `limit` записей за запрос; пока в ответе `has_more`,
+    клиент повторяет запрос с новым `since`. Если с прошлой
+    синхронизации прошло больше срока хранения удалений,
+    синхронизация начинается заново и в ответе передаётся `reset`.
+    """
+    permission_classes = (AllowAny,)
+
+    def get_collections(self):
+        """
+        Метод `get_collections` возвращает синхронизируемые коллекции:
+        queryset и сериализатор. Избранное и список покупок
+        синхронизируются только для авторизованного пользователя.
         """
-        author = get_object_or_404(CustomUser, id=id)
         user = self.request.user
-        subscription = get_object_or_404(
-            Subscription, user=user, author=author
+        recipes = Recipe.objects.defer(
+            'search_document', 'search_vector'
+        ).select_related('author').prefetch_related(
+            'tags', 'ingredientinrecipe__ingredient'
         )
-        subscription.delete()
-        return Response(status=HTTPStatus.NO_CONTENT)
+        collections = {
+            'tags': (Tag.objects.all(), TagSerializer),
+            'ingredients': (Ingredient.objects.all(), IngredientSerializer),
+            'recipes': (recipes, RecipeSerializer),
+        }
+        if user.is_authenticated:
+            collections['recipes'] = (recipes.annotate(
+                favorited=Exists(FavoriteList.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                ))
+            ), RecipeSerializer)
+            collections['favorites'] = (
+                user.favoritelist.all(), SyncFavoriteSerializer
+            )
+            collections['shopping_cart'] = (
+                user.shoppingcart.all(), SyncShoppingCartSerializer
+            )
+        return collections
+
+    def list(self, request):
+        """
+        Метод `list` возвращает изменения после позиции `since`.
+        """
+        now = timezone.now()
+        try:
+            limit = min(
+                int(request.query_params.get('limit', SYNC_PAGE_SIZE)),
+                SYNC_PAGE_SIZE
+            )
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается число.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Ожидается число больше нуля.'})
+        cursors = self.decode_since(request.query_params.get('since'))
+        synced = cursors.pop('synced', now)
+        reset = synced < now - timedelta(days=SYNC_TOMBSTONE_DAYS)
+        if reset:
+            cursors = {}
+        collections = self.get_collections()
+        has_more = False
+        changes = {}
+        for name, (queryset, serializer_class) in collections.items():
+            rows = list(self.after(
+                queryset, 'updated_at', cursors.get(name)
+            )[:limit + 1])
+            has_more = has_more or len(rows) > limit
+            rows = rows[:limit]
+            if rows:
+                cursors[name] = (rows[-1].updated_at, rows[-1].id)
+            changes[name] = serializer_class(
+                rows, many=True, context={'request': request}
+            ).data
+        tombstones = list(self.after(
+            Tombstone.objects.filter(
+                Q(user_id__isnull=True) | Q(user_id=request.user.pk),
+                collection__in=collections
+            ),
+            'deleted_at',
+            cursors.get('deleted')
+        ).values_list('collection', 'object_id', 'deleted_at', 'id')[
+            :limit + 1
+        ])
+        has_more = has_more or len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        deleted = {name: [] for name in collections}
+        for collection, object_id, deleted_at, id in tombstones:
+            deleted[collection].append(object_id)
+            cursors['deleted'] = (deleted_at, id)
+        return Response(
+            data={
+                'changes': changes,
+                'deleted': deleted,
+                'since': self.encode_since(cursors, now),
+                'has_more': has_more,
+                'reset': reset,
+            },
+            status=HTTPStatus.OK
+        )
+
+    @staticmethod
+    def after(queryset, field, cursor):
+        """
+        Метод `after` возвращает записи после позиции `cursor`
+        (значение `field` и id) в порядке (`field`, id).
+        """
+        queryset = queryset.order_by(field, 'id')
+        if cursor is None:
+            return queryset
+        value, id = cursor
+        return queryset.filter(
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': id})
+        )
+
+    @staticmethod
+    def encode_since(cursors, synced):
+        """
+        Метод `encode_since` упаковывает позиции коллекций
+        и время синхронизации в токен.
+        """
+        data = {
+            name: (value.isoformat(), id)
+            for name, (value, id) in cursors.items()
+        }
+        data['synced'] = synced.isoformat()
+        return base64.urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode()
+        ).decode()
+
+    @staticmethod
+    def decode_since(since):
+        """
+        Метод `decode_since` распаковывает токен `since`.
+        """
+        if not since:
+            return {}
+        try:
+            data = json.loads(base64.urlsafe_b64decode(since.encode()))
+            synced = parse_datetime(data.pop('synced'))
+            cursors = {
+                name: (parse_datetime(value), int(id))
+                for name, (value, id) in data.items()
+            }
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise ValidationError({'since': 'Неверный токен синхронизации.'})
+        if synced is None or None in (
+            value for value, id in cursors.values()
+        ):
+            raise ValidationError({'since': 'Неверный токен синхронизации.'})
+        cursors['synced'] = synced
+        return cursors
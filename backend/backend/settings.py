@@ -1,4 +1,5 @@
 import os
+from decimal import Decimal
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -32,12 +33,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -73,9 +78,54 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_PGBOUNCER', default='False') == 'True'
+        ),
+    }
+}
+
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+)
+
+# Реплики для чтения: DB_REPLICAS=host1,host2:5433 (для SQLite — пути
+# к файлам). Каждая получает алиас replica1, replica2, ...
+DB_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if 'sqlite3' in DATABASES['default']['ENGINE']:
+        DATABASES[f'replica{number}']['NAME'] = replica.strip()
+    DB_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ('api.db.ReplicaRouter',)
+DB_REPLICA_PIN_SECONDS = int(
+    os.getenv('DB_REPLICA_PIN_SECONDS', default=5)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
+# Кэш в памяти процесса у каждого воркера свой: данные, которые
+# инвалидируются при записи, в нём хранить нельзя.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -111,14 +161,36 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
+CATALOG_ROOT = os.path.join(MEDIA_ROOT, 'catalog')
+JOB_RESULTS_ROOT = os.path.join(BASE_DIR, 'job_results')
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'api.authentication.CachedTokenAuthentication'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer'
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser'
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.SlidingWindowThrottle'
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': os.getenv('THROTTLE_AUTH', default='10/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', default='30/min'),
+        'toggle': os.getenv('THROTTLE_TOGGLE', default='60/min'),
+        'download': os.getenv('THROTTLE_DOWNLOAD', default='5/min'),
+        'subscribe': os.getenv('THROTTLE_SUBSCRIBE', default='30/min'),
+    },
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
@@ -128,6 +200,25 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6
 
 }
+
+# Области ограничения частоты запросов: `Представление` или
+# `Представление.действие` -> ключ из DEFAULT_THROTTLE_RATES.
+THROTTLE_SCOPES = {
+    'TokenCreateView': 'auth',
+    'UserViewSet.create': 'auth',
+    'UserViewSet.set_password': 'auth',
+    'UserViewSet.reset_password': 'auth',
+    'UserViewSet.reset_password_confirm': 'auth',
+    'RecipeViewSet.create': 'recipe_write',
+    'RecipeViewSet.update': 'recipe_write',
+    'RecipeViewSet.partial_update': 'recipe_write',
+    'RecipeViewSet.destroy': 'recipe_write',
+    'RecipeViewSet.favorite': 'toggle',
+    'RecipeViewSet.shopping_cart': 'toggle',
+    'RecipeViewSet.download_shopping_cart': 'download',
+    'SubscribeViewSet': 'subscribe',
+}
+
 DJOSER = {
     'USER_ID_FIELD': 'id',
     'LOGIN_FIELD': 'email',
@@ -146,4 +237,31 @@ DJOSER = {
 PAGE_SIZE = 6
 COOKING_TIME_RECIPE = 1
 AMOUNT_INGREDIENT = 1
+MIN_MULTIPLIER = Decimal('0.01')
+# Единица измерения: (базовая единица, множитель для перевода в неё).
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
 FILENAME = 'shopping_cart'
+SEARCH_CONFIG = 'russian'
+ESTIMATED_COUNT_THRESHOLD = 100000
+BATCH_SIZE = 100
+SYNC_PAGE_SIZE = 500
+SYNC_TOMBSTONE_DAYS = 30
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+COMPRESSION_TYPES = ('application/json',)
+JOB_RETRY_DELAY = 10
+JOB_STALE_TIMEOUT = 600
+JOB_HEARTBEAT_INTERVAL = 60
+JOB_RESULT_DAYS = 1
+TAG_INDEX_TIMEOUT = 60
+TAG_INDEX_CHUNK_SIZE = 10000
+PROFILING_ENABLED = (
+    os.getenv('PROFILING_ENABLED', default='False') == 'True'
+)
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WINDOW_HOURS = 24 * 7
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=60)
+)
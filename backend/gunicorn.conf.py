@@ -0,0 +1,77 @@
+import os
+
+
+def cpu_count():
+    """
+    Метод `cpu_count` возвращает число процессоров,
+    доступных процессу (с учётом ограничений контейнера).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+wsgi_app = 'backend.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+# Потоковые воркеры: медленный клиент занимает один поток, а не
+# весь процесс. Тела запросов и ответы дополнительно буферизует nginx.
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', default=cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+
+# Воркеры перезапускаются после max_requests запросов, чтобы ограничить
+# рост памяти; разброс не даёт им перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = int(
+    os.getenv('GUNICORN_MAX_REQUESTS_JITTER', default=100)
+)
+
+# Приложение загружается в мастер-процессе до запуска воркеров,
+# и воркеры разделяют его память по принципу copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', default='True') == 'True'
+
+
+def warm_up():
+    """
+    Метод `warm_up` заранее импортирует сериализаторы и представления,
+    строит таблицу маршрутов и регистрирует шрифт для pdf-файлов.
+    """
+    from django.urls import get_resolver
+
+    import api.serializers  # noqa: F401
+    import api.views  # noqa: F401
+    from api.util import register_font
+
+    get_resolver().url_patterns
+    register_font()
+
+
+def when_ready(server):
+    """
+    Хук `when_ready` прогревает приложение в мастер-процессе
+    перед запуском воркеров.
+    """
+    if not preload_app:
+        return
+    try:
+        warm_up()
+    except Exception as error:
+        server.log.warning('Прогрев приложения не выполнен: %s', error)
+
+
+def post_worker_init(worker):
+    """
+    Хук `post_worker_init` прогревает приложение в каждом воркере,
+    если оно не было загружено в мастер-процессе.
+    """
+    if preload_app:
+        return
+    try:
+        warm_up()
+    except Exception as error:
+        worker.log.warning('Прогрев воркера не выполнен: %s', error)
@@ -1,8 +1,64 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, SEARCH_VAR
+from django.db.models import (Case, Count, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
 
 from recipes.models import (FavoriteList, Ingredient,  # isort:skip
-                            IngredientInRecipe, Recipe,
-                            ShoppingCart, Subscription, Tag)
+                            IngredientInRecipe, Job, Recipe, ShoppingCart,
+                            ShoppingListItem, Subscription, Tag)
+from recipes.paginators import EstimatedCountPaginator  # isort:skip
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Класс LargeTableAdmin — базовый класс для больших таблиц:
+    список выводится с оценочным числом записей и без
+    дополнительного подсчёта всех записей при поиске.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """
+    Класс AuthorFilter для фильтрации рецептов по автору.
+    Вместо списка всех пользователей выводит поле ввода логина
+    или адреса электронной почты автора, поиск по которым
+    выполняется по уникальным индексам.
+    """
+    title = 'автор'
+    parameter_name = 'author'
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        """
+        Метод `choices` передаёт в шаблон остальные параметры
+        запроса, чтобы сохранить их при фильтрации.
+        """
+        yield {
+            'params': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'placeholder': 'Логин или email'
+        }
+
+    def queryset(self, request, queryset):
+        """
+        Метод `queryset` возвращает рецепты выбранного автора.
+        """
+        value = self.value()
+        if not value:
+            return queryset
+        return queryset.filter(
+            Q(author__username=value) | Q(author__email=value)
+        )
 
 
 class IngredientInRecipeInline(admin.TabularInline):
@@ -11,11 +67,12 @@ class IngredientInRecipeInline(admin.TabularInline):
     модель IngredientInRecipe на той же странице, что и модель Recipe.
     """
     model = IngredientInRecipe
+    autocomplete_fields = ('ingredient',)
     min_num = 1
     extra = 0
 
 
-class IngredientInRecipeAdmin(admin.ModelAdmin):
+class IngredientInRecipeAdmin(LargeTableAdmin):
     """
     Класс IngredientInRecipeAdmin для редактирования
     модели IngredientInRecipe в интерфейсе админ-зоны.
@@ -26,10 +83,12 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
         'amount'
     )
     list_display_links = ('recipe',)
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     """
     Класс IngredientAdmin для редактирования
     модели Ingredient в  интерфейсе админ-зоны.
@@ -38,31 +97,84 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name__istartswith', 'name__contains')
 
     def get_search_results(self, request, queryset, search_term):
+        """
+        Метод `get_search_results` возвращает найденные ингредиенты:
+        сначала совпадающие по началу названия, затем остальные.
+        """
         queryset, use_distinct = super(
             IngredientAdmin, self
         ).get_search_results(request, queryset, search_term)
-        queryset1 = queryset.filter(name__istartswith=search_term)
-        queryset2 = queryset.filter(name__contains=search_term)
-        queryset = queryset1.union(queryset2, all=True)
+        if search_term:
+            queryset = queryset.annotate(
+                search_rank=Case(
+                    When(name__istartswith=search_term, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField()
+                )
+            ).order_by('search_rank', 'name')
         return queryset, use_distinct
 
+    def get_ordering(self, request):
+        """
+        Метод `get_ordering` сохраняет сортировку
+        по релевантности при поиске.
+        """
+        if request.GET.get(SEARCH_VAR):
+            return ('search_rank', 'name')
+        return super().get_ordering(request)
 
-class RecipeAdmin(admin.ModelAdmin):
+
+class RecipeAdmin(LargeTableAdmin):
     """
     Класс RecipeAdmin для редактирования
     модели Recipe в  интерфейсе админ-зоны.
     """
     inlines = (IngredientInRecipeInline, )
     list_display = ('author', 'name', 'count_favorite')
-    list_filter = ('author', 'tags')
-    search_fields = ('name', 'author__username')
+    list_filter = (AuthorFilter, 'tags')
+    list_select_related = ('author',)
+    autocomplete_fields = ('author', 'tags')
+    search_fields = ('name__istartswith', 'author__username__istartswith')
+
+    def get_queryset(self, request):
+        """
+        Метод `get_queryset` добавляет к рецептам число добавлений
+        в избранное подзапросом, который выполняется только для
+        рецептов текущей страницы, и не загружает поисковые поля.
+        """
+        favorites = FavoriteList.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            total=Count('pk')
+        ).values('total')
+        return super().get_queryset(request).defer(
+            'search_document', 'search_vector'
+        ).annotate(
+            favorite_count=Subquery(favorites, output_field=IntegerField())
+        )
 
     def count_favorite(self, obj):
         """
         Метод `count_favorite` для вывода общего
         числа добавления рецепта в избранное.
         """
-        return FavoriteList.objects.filter(recipe=obj).count()
+        return obj.favorite_count or 0
+
+    count_favorite.short_description = 'В избранном'
+    count_favorite.admin_order_field = 'favorite_count'
+
+    def save_related(self, request, form, formsets, change):
+        """
+        Метод `save_related` пересчитывает сводные списки покупок
+        пользователей и поисковый документ рецепта
+        при изменении ингредиентов рецепта.
+        """
+        ShoppingListItem.objects.remove_recipe(form.instance)
+        super().save_related(request, form, formsets, change)
+        ShoppingListItem.objects.add_recipe(form.instance)
+        form.instance.update_search_document(
+            form.instance.ingredients.values_list('name', flat=True)
+        )
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -72,16 +184,19 @@ class TagAdmin(admin.ModelAdmin):
     """
     list_display = ('name', 'color')
     list_editable = ('color',)
+    ordering = ('name',)
     prepopulated_fields = {'slug': ('name', )}
     search_fields = ('name',)
 
 
-class FavoriteListAdmin(admin.ModelAdmin):
+class FavoriteListAdmin(LargeTableAdmin):
     """
     Класс FavoriteListAdmin для редактирования
     модели FavoriteList в интерфейсе админ-зоны.
     """
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__email',
@@ -89,12 +204,14 @@ class FavoriteListAdmin(admin.ModelAdmin):
     )
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     """
     Класс ShoppingCartAdmin для редактирования
     модели ShoppingCart в интерфейсе админ-зоны.
     """
-    list_display = ('user', 'recipe')
+    list_display = ('user', 'recipe', 'multiplier')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__email',
@@ -102,18 +219,51 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
 
 
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdmin):
     """
     Класс SubscriptionAdmin для редактирования
     модели Subscription в интерфейсе админ-зоны.
     """
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     search_fields = (
         'user__username',
         'user__email'
     )
 
 
+class ShoppingListItemAdmin(LargeTableAdmin):
+    """
+    Класс ShoppingListItemAdmin для просмотра
+    модели ShoppingListItem в интерфейсе админ-зоны.
+    """
+    list_display = ('user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'ingredient__name'
+    )
+    readonly_fields = ('user', 'ingredient', 'amount')
+
+
+class JobAdmin(LargeTableAdmin):
+    """
+    Класс JobAdmin для просмотра и постановки фоновых задач
+    в интерфейсе админ-зоны.
+    """
+    list_display = (
+        'id', 'task', 'status', 'priority', 'progress', 'attempts',
+        'run_at', 'user'
+    )
+    list_filter = ('status', 'task')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    search_fields = ('task', 'user__username')
+    readonly_fields = ('attempts', 'progress', 'result', 'error')
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Recipe, RecipeAdmin)
@@ -121,3 +271,5 @@ admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
 admin.site.register(FavoriteList, FavoriteListAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
+admin.site.register(Job, JobAdmin)
@@ -4,10 +4,12 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from api.catalog import write_catalog
 from recipes.models import Ingredient  # isort:skip
 
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+BATCH_SIZE = 1000
 
 
 class Command(BaseCommand):
@@ -25,12 +27,15 @@ class Command(BaseCommand):
                 encoding='utf8'
             ) as csv_file:
                 data = csv.reader(csv_file)
-                for row in data:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
+                Ingredient.objects.bulk_create(
+                    (
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in data
+                    ),
+                    batch_size=BATCH_SIZE,
+                    ignore_conflicts=True
+                )
         except FileNotFoundError:
             raise CommandError('Добавьте файл ingredients в директорию data')
+        write_catalog('ingredients')
         self.stdout.write('Записи добавленны в базу данных')
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.settings import TRENDING_HALF_LIFE_HOURS, TRENDING_WINDOW_HOURS
+from recipes.models import Recipe, RecipeActivity  # isort:skip
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Recalculate trending scores and drop expired activity counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Recount popularity from favorites and shopping carts'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        RecipeActivity.objects.filter(
+            hour__lt=now - timedelta(hours=TRENDING_WINDOW_HOURS)
+        ).delete()
+        trending = defaultdict(float)
+        activity = RecipeActivity.objects.values_list(
+            'recipe_id', 'hour', 'count'
+        )
+        for recipe_id, hour, count in activity.iterator():
+            age = (now - hour).total_seconds() / 3600
+            trending[recipe_id] += count * 0.5 ** (
+                age / TRENDING_HALF_LIFE_HOURS
+            )
+        self.save_scores('trending', trending)
+        if options['recount']:
+            popularity = defaultdict(int)
+            for related in ('favoriterecipe', 'shoppingcartrecipe'):
+                counts = Recipe.objects.annotate(
+                    total=Count(related)
+                ).filter(total__gt=0).values_list('id', 'total')
+                for recipe_id, total in counts.iterator():
+                    popularity[recipe_id] += total
+            self.save_scores('popularity', popularity)
+        self.stdout.write('Рейтинги рецептов пересчитаны')
+
+    def save_scores(self, field, scores):
+        """
+        Метод `save_scores` одной транзакцией обнуляет поле `field`
+        у всех рецептов и записывает рассчитанные значения.
+        """
+        with transaction.atomic():
+            Recipe.objects.filter(**{f'{field}__gt': 0}).update(**{field: 0})
+            Recipe.objects.bulk_update(
+                (
+                    Recipe(id=recipe_id, **{field: score})
+                    for recipe_id, score in scores.items()
+                ),
+                (field,),
+                batch_size=BATCH_SIZE
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog import CATALOGS, write_catalog
+from backend.settings import CATALOG_ROOT
+
+
+class Command(BaseCommand):
+    help = 'Write JSON snapshots of catalogs with precompressed copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'catalogs', nargs='*', choices=tuple(CATALOGS),
+            help='Catalogs to write (all by default)'
+        )
+
+    def handle(self, *args, **options):
+        for name in options['catalogs'] or CATALOGS:
+            sizes = ', '.join(
+                f'{suffix}: {len(data)}'
+                for suffix, data in write_catalog(name).items()
+            )
+            self.stdout.write(f'{CATALOG_ROOT}/{name} ({sizes})')
@@ -0,0 +1,73 @@
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import IngredientInRecipe, Recipe  # isort:skip
+
+RECIPE_FIELDS = ('id', 'name', 'text', 'cooking_time', 'image', 'pub_date')
+
+
+class Command(BaseCommand):
+    help = 'Export recipes with tags and ingredients as JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', nargs='?', default='-', type=str)
+        parser.add_argument('--chunk-size', default=2000, type=int)
+
+    def handle(self, *args, **options):
+        if options['filename'] == '-':
+            self.export(sys.stdout, options['chunk_size'])
+            return
+        with open(options['filename'], 'w', encoding='utf8') as file:
+            count = self.export(file, options['chunk_size'])
+        self.stdout.write(f'Выгружено рецептов: {count}')
+
+    def export(self, file, chunk_size):
+        """
+        Метод `export` построчно записывает рецепты в файл. Рецепты
+        читаются пачками по первичному ключу, а теги и ингредиенты
+        загружаются одним запросом на пачку, поэтому расход памяти
+        не зависит от размера каталога.
+        """
+        count = 0
+        last_id = 0
+        recipes = Recipe.objects.order_by('id').values(
+            *RECIPE_FIELDS, 'author__email'
+        )
+        while True:
+            chunk = list(recipes.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return count
+            ids = [recipe['id'] for recipe in chunk]
+            tags = defaultdict(list)
+            for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids
+            ).values_list('recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, unit, amount in (
+                IngredientInRecipe.objects.filter(
+                    recipe_id__in=ids
+                ).values_list(
+                    'recipe_id',
+                    'ingredient__name',
+                    'ingredient__measurement_unit',
+                    'amount'
+                )
+            ):
+                ingredients[recipe_id].append({
+                    'name': name,
+                    'measurement_unit': unit,
+                    'amount': amount
+                })
+            for recipe in chunk:
+                recipe_id = recipe.pop('id')
+                recipe['author'] = recipe.pop('author__email')
+                recipe['pub_date'] = recipe['pub_date'].isoformat()
+                recipe['tags'] = tags[recipe_id]
+                recipe['ingredients'] = ingredients[recipe_id]
+                file.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+            count += len(chunk)
+            last_id = ids[-1]
@@ -0,0 +1,180 @@
+import json
+import os
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.catalog import schedule_catalog
+from recipes.models import (Ingredient, IngredientInRecipe,  # isort:skip
+                            Recipe, Tag)
+from recipes.tag_index import invalidate_tag_indexes  # isort:skip
+from users.models import CustomUser  # isort:skip
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from a JSON Lines file made by export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', type=str)
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument(
+            '--checkpoint', type=str,
+            help='File with the number of imported lines to resume from'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        done = self.read_checkpoint(checkpoint)
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.imported = self.skipped = 0
+        try:
+            with open(options['filename'], encoding='utf8') as file:
+                lines = islice(file, done, None)
+                while True:
+                    batch = list(islice(lines, options['batch_size']))
+                    if not batch:
+                        break
+                    with transaction.atomic():
+                        self.import_batch([json.loads(line) for line in batch])
+                    done += len(batch)
+                    self.write_checkpoint(checkpoint, done)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {options["filename"]} не найден')
+        self.stdout.write(
+            f'Импортировано рецептов: {self.imported}, '
+            f'пропущено: {self.skipped}'
+        )
+
+    def import_batch(self, records):
+        """
+        Метод `import_batch` сохраняет пачку рецептов: рецепты, связи
+        с тегами и ингредиенты в рецептах создаются через `bulk_create`.
+        Рецепты, которые уже есть у автора, и рецепты неизвестных
+        авторов пропускаются.
+        """
+        authors = dict(CustomUser.objects.filter(
+            email__in={record['author'] for record in records}
+        ).values_list('email', 'id'))
+        existing = set(Recipe.objects.filter(
+            author_id__in=authors.values(),
+            name__in={record['name'] for record in records}
+        ).values_list('author_id', 'name'))
+        ingredients = self.get_ingredients(records)
+        new = {}
+        for record in records:
+            author_id = authors.get(record['author'])
+            key = (author_id, record['name'])
+            if author_id is None or key in existing or key in new:
+                self.skipped += 1
+                continue
+            new[key] = record
+        if not new:
+            return
+        Recipe.objects.bulk_create(
+            Recipe(
+                author_id=author_id,
+                name=name,
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+                ingredient_count=len(record['ingredients']),
+                search_document=Recipe.build_search_document(
+                    name, record['text'],
+                    (item['name'] for item in record['ingredients'])
+                )
+            ) for (author_id, name), record in new.items()
+        )
+        recipes = Recipe.objects.filter(
+            author_id__in={author_id for author_id, name in new},
+            name__in={name for author_id, name in new}
+        ).only('id', 'author_id', 'name')
+        recipes = [
+            recipe for recipe in recipes
+            if (recipe.author_id, recipe.name) in new
+        ]
+        for recipe in recipes:
+            recipe.pub_date = datetime.fromisoformat(
+                new[(recipe.author_id, recipe.name)]['pub_date']
+            )
+        Recipe.objects.bulk_update(recipes, ('pub_date',))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tags[slug])
+            for recipe in recipes
+            for slug in new[(recipe.author_id, recipe.name)]['tags']
+            if slug in self.tags
+        )
+        invalidate_tag_indexes(self.tags.values())
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=recipe.id,
+                ingredient_id=ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                amount=item['amount']
+            )
+            for recipe in recipes
+            for item in new[(recipe.author_id, recipe.name)]['ingredients']
+        )
+        Recipe.update_search_vectors(
+            Recipe.objects.filter(id__in=[recipe.id for recipe in recipes])
+        )
+        self.imported += len(recipes)
+
+    def get_ingredients(self, records):
+        """
+        Метод `get_ingredients` возвращает идентификаторы ингредиентов
+        пачки по названию и единице измерения, создавая недостающие.
+        """
+        keys = {
+            (item['name'], item['measurement_unit'])
+            for record in records
+            for item in record['ingredients']
+        }
+        names = {name for name, unit in keys}
+        found = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.filter(
+                name__in=names
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        missing = keys - found.keys()
+        if missing:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in missing
+                ),
+                ignore_conflicts=True
+            )
+            schedule_catalog('ingredients')
+            found.update({
+                (name, unit): ingredient_id
+                for ingredient_id, name, unit in Ingredient.objects.filter(
+                    name__in={name for name, unit in missing}
+                ).values_list('id', 'name', 'measurement_unit')
+            })
+        return found
+
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        """
+        Метод `read_checkpoint` возвращает число уже
+        импортированных строк файла.
+        """
+        if checkpoint is None or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint, encoding='utf8') as file:
+            return int(file.read().strip() or 0)
+
+    @staticmethod
+    def write_checkpoint(checkpoint, done):
+        """
+        Метод `write_checkpoint` сохраняет число
+        импортированных строк файла.
+        """
+        if checkpoint is None:
+            return
+        with open(checkpoint, 'w', encoding='utf8') as file:
+            file.write(str(done))
@@ -0,0 +1,66 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.settings import PROFILE_ROOT
+
+
+class Command(BaseCommand):
+    help = 'List captured request profiles or summarize one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'name', nargs='?',
+            help='Profile to summarize (as listed, without extension)'
+        )
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=('cumulative', 'tottime', 'ncalls'),
+            help='Sort key for the summary'
+        )
+        parser.add_argument('--limit', default=25, type=int)
+
+    def handle(self, *args, **options):
+        if options['name'] is None:
+            self.list_profiles(options['limit'])
+            return
+        path = os.path.join(PROFILE_ROOT, f'{options["name"]}.prof')
+        if not os.path.exists(path):
+            raise CommandError(f'Профиль {options["name"]} не найден')
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(
+            options['limit']
+        )
+        self.stdout.write(output.getvalue())
+        self.stdout.write(
+            'Свёрнутые стеки для flamegraph.pl/speedscope: '
+            f'{path[:-len(".prof")]}.collapsed'
+        )
+
+    def list_profiles(self, limit):
+        """
+        Метод `list_profiles` выводит последние профили
+        с числом вызовов и общим временем.
+        """
+        if not os.path.isdir(PROFILE_ROOT):
+            names = []
+        else:
+            names = sorted(
+                (
+                    name[:-len('.prof')]
+                    for name in os.listdir(PROFILE_ROOT)
+                    if name.endswith('.prof')
+                ),
+                reverse=True
+            )[:limit]
+        if not names:
+            self.stdout.write('Профилей нет')
+        for name in names:
+            stats = pstats.Stats(os.path.join(PROFILE_ROOT, f'{name}.prof'))
+            self.stdout.write(
+                f'{name}  вызовов: {stats.total_calls}, '
+                f'время: {stats.total_tt:.3f} с'
+            )
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.settings import SYNC_TOMBSTONE_DAYS
+from recipes.models import Tombstone  # isort:skip
+
+
+class Command(BaseCommand):
+    help = 'Delete deletion records older than SYNC_TOMBSTONE_DAYS'
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(
+            deleted_at__lt=timezone.now() - timedelta(
+                days=SYNC_TOMBSTONE_DAYS
+            )
+        ).delete()
+        self.stdout.write(f'Удалено записей: {deleted}')
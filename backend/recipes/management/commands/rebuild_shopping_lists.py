@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListItem  # isort:skip
+from users.models import CustomUser  # isort:skip
+
+
+class Command(BaseCommand):
+    help = 'Rebuild aggregated shopping lists from shopping carts'
+
+    def handle(self, *args, **options):
+        ShoppingListItem.objects.filter(
+            user__shoppingcart__isnull=True
+        ).delete()
+        users = CustomUser.objects.filter(
+            shoppingcart__isnull=False
+        ).distinct().iterator()
+        for user in users:
+            ShoppingListItem.objects.rebuild(user)
+        self.stdout.write('Списки покупок пересчитаны')
@@ -0,0 +1,103 @@
+import logging
+import signal
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api.jobs import TASKS
+from backend.settings import (JOB_HEARTBEAT_INTERVAL, JOB_RESULT_DAYS,
+                              JOB_STALE_TIMEOUT)
+from recipes.models import Job  # isort:skip
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the queue is empty'
+        )
+        parser.add_argument(
+            '--sleep', default=1.0, type=float,
+            help='Seconds to wait when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        maintained = 0
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            close_old_connections()
+            if time.monotonic() - maintained > MAINTENANCE_INTERVAL:
+                Job.objects.requeue_stale(JOB_STALE_TIMEOUT)
+                Job.objects.purge(JOB_RESULT_DAYS)
+                maintained = time.monotonic()
+            job = Job.objects.claim()
+            if job is not None:
+                self.run(job)
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+    def stop(self, signum, frame):
+        """
+        Метод `stop` завершает работу после текущей задачи.
+        """
+        self.running = False
+
+    @contextmanager
+    def heartbeat(self, job):
+        """
+        Метод `heartbeat` на время выполнения задачи каждые
+        `JOB_HEARTBEAT_INTERVAL` секунд обновляет её `updated_at`
+        из отдельного потока, чтобы долгая задача живого воркера
+        не была возвращена в очередь как зависшая.
+        """
+        stopped = threading.Event()
+
+        def beat():
+            try:
+                while not stopped.wait(JOB_HEARTBEAT_INTERVAL):
+                    try:
+                        Job.objects.heartbeat(job.pk)
+                    except Exception:
+                        logger.exception('Сигнал задачи %s не отправлен', job)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def run(self, job):
+        """
+        Метод `run` выполняет задачу. При ошибке задача
+        повторяется позже или отмечается завершённой с ошибкой.
+        """
+        func = TASKS.get(job.task)
+        try:
+            if func is None:
+                raise LookupError(f'Неизвестная задача {job.task}')
+            with self.heartbeat(job):
+                func(job)
+        except Exception:
+            logger.exception('Задача %s завершилась с ошибкой', job)
+            job.fail(traceback.format_exc())
+        else:
+            job.finish()
+        self.stdout.write(str(job))
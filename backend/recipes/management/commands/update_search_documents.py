@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe  # isort:skip
+
+
+class Command(BaseCommand):
+    help = 'Rebuild recipe search documents'
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.prefetch_related('ingredients').only(
+            'id', 'name', 'text'
+        )
+        for recipe in recipes.iterator():
+            recipe.update_search_document(
+                ingredient.name for ingredient in recipe.ingredients.all()
+            )
+        self.stdout.write('Поисковые документы рецептов обновлены')
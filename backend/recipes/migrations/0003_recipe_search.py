@@ -0,0 +1,65 @@
+# Generated by Django 2.2.19 on 2026-10-19 12:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_vector_index(apps, schema_editor):
+    """
+    Функция `create_search_vector_index` создаёт GIN-индекс
+    поискового вектора рецептов. В остальных СУБД индекса нет:
+    поиск в них идёт по `search_document`.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "recipe_search_vector_idx" '
+        'ON "recipes_recipe" USING gin ("search_vector")'
+    )
+
+
+def drop_search_vector_index(apps, schema_editor):
+    """
+    Функция `drop_search_vector_index` удаляет GIN-индекс
+    поискового вектора рецептов.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "recipe_search_vector_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=['search_vector'],
+                        name='recipe_search_vector_idx'
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    create_search_vector_index, drop_search_vector_index
+                ),
+            ],
+        ),
+    ]
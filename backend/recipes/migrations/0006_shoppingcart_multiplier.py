@@ -0,0 +1,25 @@
+# Generated by Django 2.2.19 on 2026-10-19 12:40
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='multiplier',
+            field=models.DecimalField(decimal_places=2, default=1, help_text='Во сколько раз увеличить количество ингредиентов', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Число порций'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Количество'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.19 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+def create_name_upper_index(apps, schema_editor):
+    """
+    Функция `create_name_upper_index` создаёт индекс по UPPER(name)
+    рецептов для поиска без учёта регистра по началу названия
+    (`name__istartswith`) в админ-зоне. Индексы по выражениям
+    создаются только в PostgreSQL.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "recipe_name_upper_idx" '
+        'ON "recipes_recipe" (UPPER("name"::text) text_pattern_ops)'
+    )
+
+
+def drop_name_upper_index(apps, schema_editor):
+    """
+    Функция `drop_name_upper_index` удаляет индекс по UPPER(name)
+    рецептов.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "recipe_name_upper_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shoppingcart_multiplier'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='name',
+            field=models.CharField(db_index=True, help_text='Введите название рецепта', max_length=200, verbose_name='Название'),
+        ),
+        migrations.RunPython(create_name_upper_index, drop_name_upper_index),
+    ]
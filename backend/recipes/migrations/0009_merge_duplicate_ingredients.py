@@ -0,0 +1,77 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Функция `merge_duplicate_ingredients` объединяет ингредиенты
+    с одинаковыми названием и единицей измерения перед добавлением
+    ограничения `unique_ingredient`. Ссылки в рецептах и сводных
+    списках покупок переносятся на ингредиент с наименьшим id,
+    количества складываются, если там уже есть оба. Изменённые
+    рецепты получают новую дату изменения, а удалённые дубликаты
+    записываются для синхронизации клиентов.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    Tombstone = apps.get_model('recipes', 'Tombstone')
+    db_alias = schema_editor.connection.alias
+
+    groups = Ingredient.objects.using(db_alias).values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in groups:
+        keep = group['keep']
+        duplicates = list(Ingredient.objects.using(db_alias).filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=keep).values_list('id', flat=True))
+        recipe_ids = list(IngredientInRecipe.objects.using(db_alias).filter(
+            ingredient_id__in=duplicates
+        ).values_list('recipe_id', flat=True))
+        for model, owner in (
+            (IngredientInRecipe, 'recipe_id'),
+            (ShoppingListItem, 'user_id'),
+        ):
+            rows = model.objects.using(db_alias).filter(
+                ingredient_id__in=(keep, *duplicates)
+            )
+            collisions = rows.values(owner).annotate(
+                total=Sum('amount'), count=Count('id')
+            ).filter(count__gt=1)
+            for collision in collisions:
+                rows.filter(**{owner: collision[owner]}).delete()
+                model.objects.using(db_alias).create(**{
+                    owner: collision[owner],
+                    'ingredient_id': keep,
+                    'amount': collision['total'],
+                })
+            rows.filter(ingredient_id__in=duplicates).update(
+                ingredient_id=keep
+            )
+        Recipe.objects.using(db_alias).filter(id__in=recipe_ids).update(
+            updated_at=timezone.now()
+        )
+        Ingredient.objects.using(db_alias).filter(
+            id__in=duplicates
+        ).delete()
+        Tombstone.objects.using(db_alias).bulk_create(
+            Tombstone(collection='ingredients', object_id=duplicate)
+            for duplicate in duplicates
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
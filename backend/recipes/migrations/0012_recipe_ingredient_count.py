@@ -0,0 +1,39 @@
+# Generated by Django 2.2.19 on 2026-10-19 12:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredient_count(apps, schema_editor):
+    """
+    Функция `fill_ingredient_count` одним запросом заполняет число
+    ингредиентов существующих рецептов.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    db_alias = schema_editor.connection.alias
+    counts = IngredientInRecipe.objects.using(db_alias).filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(count=Count('id')).values('count')
+    Recipe.objects.using(db_alias).update(ingredient_count=Coalesce(
+        Subquery(counts, output_field=models.IntegerField()), Value(0)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Число ингредиентов'),
+        ),
+        migrations.RunPython(
+            fill_ingredient_count, migrations.RunPython.noop
+        ),
+    ]
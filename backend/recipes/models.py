@@ -1,9 +1,35 @@
+import json
+from collections import defaultdict
+from datetime import timedelta
+
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
 
 from backend.settings import (AMOUNT_INGREDIENT, AUTH_USER_MODEL,
-                              COOKING_TIME_RECIPE)
+                              COOKING_TIME_RECIPE, JOB_RESULTS_ROOT,
+                              JOB_RETRY_DELAY, MIN_MULTIPLIER, SEARCH_CONFIG,
+                              UNIT_CONVERSIONS)
+
+
+@deconstructible
+class JobStorage(FileSystemStorage):
+    """
+    Класс JobStorage для файлов результатов фоновых задач
+    в `JOB_RESULTS_ROOT`. Путь не передаётся в конструктор,
+    поэтому не попадает в миграции.
+    """
+    def __init__(self):
+        super().__init__(location=JOB_RESULTS_ROOT)
+
+
+job_storage = JobStorage()
 
 
 class Ingredient(models.Model):
@@ -20,10 +46,26 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения',
         help_text='Введите единицу измерения'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='ingredient_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -50,10 +92,20 @@ class Tag(models.Model):
         verbose_name='Уникальный слаг',
         help_text='Введите слаг'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Тэг'
         verbose_name_plural = 'Тэги'
+        indexes = (
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='tag_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -72,6 +124,7 @@ class Recipe(models.Model):
     )
     name = models.CharField(
         max_length=200,
+        db_index=True,
         verbose_name='Название',
         help_text='Введите название рецепта'
     )
@@ -107,6 +160,37 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Поисковый документ'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    popularity = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Популярность'
+    )
+    trending = models.FloatField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Рейтинг в трендах'
+    )
+    ingredient_count = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число ингредиентов'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -118,10 +202,63 @@ class Recipe(models.Model):
                 name='unique_recipe_author'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='recipe_updated_idx'
+            ),
+            # Создаётся только в PostgreSQL (миграция 0004).
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def build_search_document(name, text, ingredient_names):
+        """
+        Метод `build_search_document` возвращает поисковый документ
+        рецепта: название, описание и названия ингредиентов.
+        """
+        return ' '.join((name, text, *ingredient_names)).lower()
+
+    @staticmethod
+    def update_search_vectors(recipes):
+        """
+        Метод `update_search_vectors` одним запросом пересчитывает
+        `tsvector` рецептов по их поисковым документам (PostgreSQL).
+        """
+        if connection.vendor == 'postgresql':
+            recipes.update(search_vector=SearchVector(
+                'search_document', config=SEARCH_CONFIG
+            ))
+
+    def update_search_document(self, ingredient_names):
+        """
+        Метод `update_search_document` одним запросом сохраняет
+        поисковый документ рецепта. В PostgreSQL заодно
+        пересчитывается `tsvector`.
+        """
+        self.search_document = self.build_search_document(
+            self.name, self.text, ingredient_names
+        )
+        fields = {'search_document': self.search_document}
+        if connection.vendor == 'postgresql':
+            fields['search_vector'] = SearchVector(
+                models.Value(
+                    self.search_document, output_field=models.TextField()
+                ),
+                config=SEARCH_CONFIG
+            )
+        Recipe.objects.filter(pk=self.pk).update(**fields)
+
 
 class IngredientInRecipe(models.Model):
     """
@@ -210,6 +347,10 @@ class FavoriteList(models.Model):
         related_name='favoriterecipe',
         verbose_name='Рецепт'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Cписок избранного'
@@ -220,6 +361,12 @@ class FavoriteList(models.Model):
                 name='unique_favorite_recipe'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'updated_at', 'id'),
+                name='favorite_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return (
@@ -244,6 +391,18 @@ class ShoppingCart(models.Model):
         related_name='shoppingcartrecipe',
         verbose_name='Рецепт'
     )
+    multiplier = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=1,
+        validators=(MinValueValidator(MIN_MULTIPLIER),),
+        verbose_name='Число порций',
+        help_text='Во сколько раз увеличить количество ингредиентов'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Cписок покупок'
@@ -254,9 +413,548 @@ class ShoppingCart(models.Model):
                 name='unique_shoppingcart_recipe'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'updated_at', 'id'),
+                name='shoppingcart_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return (
             f'Пользователь {self.user} '
             f'добавил в список покупок рецепт: "{self.recipe}"'
         )
+
+
+class ShoppingListManager(models.Manager):
+    """
+    Менеджер ShoppingListManager поддерживает сводный список покупок
+    пользователей в актуальном состоянии: при добавлении рецепта
+    в список покупок количество его ингредиентов прибавляется,
+    при удалении — вычитается.
+    """
+    def add_recipe(self, recipe, user_ids=None):
+        """
+        Метод `add_recipe` прибавляет ингредиенты рецепта
+        к спискам покупок пользователей.
+        """
+        self._apply_recipe(recipe, user_ids, 1)
+
+    def remove_recipe(self, recipe, user_ids=None):
+        """
+        Метод `remove_recipe` вычитает ингредиенты рецепта
+        из списков покупок пользователей.
+        """
+        self._apply_recipe(recipe, user_ids, -1)
+
+    def rebuild(self, user):
+        """
+        Метод `rebuild` полностью пересчитывает
+        список покупок пользователя.
+        """
+        with transaction.atomic():
+            self.filter(user=user).delete()
+            totals = ShoppingCart.objects.filter(
+                user=user,
+                recipe__ingredientinrecipe__isnull=False
+            ).values(
+                'recipe__ingredientinrecipe__ingredient'
+            ).annotate(
+                total=models.Sum(
+                    models.F('recipe__ingredientinrecipe__amount')
+                    * models.F('multiplier'),
+                    output_field=models.DecimalField(
+                        max_digits=12, decimal_places=2
+                    )
+                )
+            )
+            self.bulk_create(
+                self.model(
+                    user=user,
+                    ingredient_id=item[
+                        'recipe__ingredientinrecipe__ingredient'
+                    ],
+                    amount=item['total']
+                ) for item in totals
+            )
+
+    def totals(self, user):
+        """
+        Метод `totals` одним агрегирующим запросом возвращает список
+        покупок пользователя. Количества ингредиентов в совместимых
+        единицах измерения (кг и г, л и мл) приводятся к базовой
+        единице из таблицы `UNIT_CONVERSIONS` и складываются.
+        """
+        unit = models.F('ingredient__measurement_unit')
+        factor = models.Case(
+            *(
+                models.When(
+                    ingredient__measurement_unit=from_unit,
+                    then=models.Value(ratio)
+                )
+                for from_unit, (to_unit, ratio) in UNIT_CONVERSIONS.items()
+            ),
+            default=models.Value(1),
+            output_field=models.DecimalField()
+        )
+        base_unit = models.Case(
+            *(
+                models.When(
+                    ingredient__measurement_unit=from_unit,
+                    then=models.Value(to_unit)
+                )
+                for from_unit, (to_unit, ratio) in UNIT_CONVERSIONS.items()
+            ),
+            default=unit,
+            output_field=models.CharField()
+        )
+        return self.filter(user=user, amount__gt=0).values(
+            name=models.F('ingredient__name'),
+            measurement_unit=base_unit
+        ).annotate(
+            total=models.Sum(
+                models.F('amount') * factor,
+                output_field=models.DecimalField(
+                    max_digits=14, decimal_places=2
+                )
+            )
+        ).order_by('name', 'measurement_unit')
+
+    def _apply_recipe(self, recipe, user_ids, sign):
+        """
+        Метод `_apply_recipe` изменяет списки покупок пользователей
+        на количество ингредиентов рецепта, умноженное на число
+        порций из списка покупок, со знаком `sign`.
+        Если `user_ids` не переданы, изменяются списки всех
+        пользователей, добавивших рецепт в список покупок.
+        """
+        carts = ShoppingCart.objects.filter(recipe=recipe)
+        if user_ids is not None:
+            carts = carts.filter(user_id__in=user_ids)
+        cart_user_ids = []
+        users_by_multiplier = defaultdict(list)
+        for user_id, multiplier in carts.values_list('user_id', 'multiplier'):
+            cart_user_ids.append(user_id)
+            users_by_multiplier[multiplier].append(user_id)
+        if not cart_user_ids:
+            return
+        amounts = dict(IngredientInRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount'))
+        if not amounts:
+            return
+        with transaction.atomic():
+            if sign > 0:
+                self.bulk_create(
+                    (
+                        self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=0
+                        )
+                        for user_id in cart_user_ids
+                        for ingredient_id in amounts
+                    ),
+                    ignore_conflicts=True
+                )
+            for multiplier, group in users_by_multiplier.items():
+                for ingredient_id, amount in amounts.items():
+                    self.filter(
+                        user_id__in=group, ingredient_id=ingredient_id
+                    ).update(
+                        amount=models.F('amount') + sign * amount * multiplier
+                    )
+            if sign < 0:
+                self.filter(
+                    user_id__in=cart_user_ids,
+                    ingredient_id__in=amounts,
+                    amount__lte=0
+                ).delete()
+
+
+class ShoppingListItem(models.Model):
+    """
+    Класс ShoppingListItem для хранения сводного списка покупок:
+    общего количества каждого ингредиента по всем рецептам
+    из списка покупок пользователя.
+    """
+    user = models.ForeignKey(
+        AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shoppinglist',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shoppinglist',
+        verbose_name='Ингредиент'
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shoppinglist_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return (
+            f'Пользователю {self.user} нужно купить: '
+            f'{self.ingredient} — {self.amount}'
+        )
+
+
+class RecipeActivityManager(models.Manager):
+    """
+    Менеджер RecipeActivityManager ведёт почасовые счётчики
+    добавлений рецепта в избранное и список покупок
+    и популярность рецепта.
+    """
+    def track(self, recipe_id, delta):
+        """
+        Метод `track` изменяет популярность рецепта на `delta`.
+        Добавление (`delta` > 0) учитывается в счётчике текущего часа,
+        по которому рассчитывается рейтинг в трендах.
+        """
+        recipes = Recipe.objects.filter(pk=recipe_id)
+        if delta < 0:
+            recipes.filter(popularity__gte=-delta).update(
+                popularity=models.F('popularity') + delta
+            )
+            return
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        with transaction.atomic():
+            recipes.update(popularity=models.F('popularity') + delta)
+            self.bulk_create(
+                (self.model(recipe_id=recipe_id, hour=hour, count=0),),
+                ignore_conflicts=True
+            )
+            self.filter(recipe_id=recipe_id, hour=hour).update(
+                count=models.F('count') + delta
+            )
+
+
+class RecipeActivity(models.Model):
+    """
+    Класс RecipeActivity для почасовых счётчиков добавлений
+    рецепта в избранное и список покупок. Устаревшие счётчики
+    удаляются командой `compact_recipe_scores`.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Рецепт'
+    )
+    hour = models.DateTimeField(
+        db_index=True,
+        verbose_name='Час'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число добавлений'
+    )
+
+    objects = RecipeActivityManager()
+
+    class Meta:
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'hour'),
+                name='unique_recipe_activity_hour'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} — {self.hour}: {self.count}'
+
+
+class Tombstone(models.Model):
+    """
+    Класс Tombstone для записей об удалённых объектах, по которым
+    клиенты синхронизируют удаления. Для избранного и списка покупок
+    запоминаются пользователь и id рецепта. Устаревшие записи
+    удаляются командой `purge_tombstones`.
+    """
+    collection = models.CharField(
+        max_length=32,
+        verbose_name='Коллекция'
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='Id объекта'
+    )
+    user_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Id пользователя'
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата удаления'
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        indexes = (
+            models.Index(
+                fields=('deleted_at', 'id'),
+                name='tombstone_deleted_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.collection} {self.object_id}'
+
+
+class JobManager(models.Manager):
+    """
+    Менеджер JobManager для очереди фоновых задач в базе данных.
+    """
+    def enqueue(self, task, user=None, priority=0, **arguments):
+        """
+        Метод `enqueue` ставит задачу `task` в очередь.
+        Задачи с большим `priority` выполняются раньше.
+        """
+        return self.create(
+            task=task,
+            user=user,
+            priority=priority,
+            arguments=json.dumps(arguments)
+        )
+
+    def enqueue_once(self, task, **arguments):
+        """
+        Метод `enqueue_once` ставит задачу `task` в очередь, если
+        такая же задача с теми же аргументами ещё не ожидает
+        выполнения. Уже выполняемая задача не учитывается: она могла
+        прочитать данные до изменения.
+        """
+        if self.filter(
+            task=task, status=Job.PENDING, arguments=json.dumps(arguments)
+        ).exists():
+            return None
+        return self.enqueue(task, **arguments)
+
+    def claim(self):
+        """
+        Метод `claim` забирает из очереди следующую задачу
+        и отмечает её выполняемой. Несколько воркеров не получат
+        одну задачу: в PostgreSQL занятые строки пропускаются
+        (SKIP LOCKED), а смена статуса выполняется только
+        у ещё ожидающей задачи.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = self.filter(
+                status=Job.PENDING, run_at__lte=now
+            ).order_by('-priority', 'run_at', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                jobs = jobs.select_for_update(skip_locked=True)
+            job = jobs.first()
+            if job is None or not self.filter(
+                pk=job.pk, status=Job.PENDING
+            ).update(
+                status=Job.RUNNING,
+                attempts=models.F('attempts') + 1,
+                updated_at=now
+            ):
+                return None
+        job.refresh_from_db()
+        return job
+
+    def heartbeat(self, pk):
+        """
+        Метод `heartbeat` обновляет `updated_at` выполняемой задачи,
+        показывая, что её воркер жив.
+        """
+        return self.filter(pk=pk, status=Job.RUNNING).update(
+            updated_at=timezone.now()
+        )
+
+    def requeue_stale(self, timeout):
+        """
+        Метод `requeue_stale` возвращает в очередь задачи, от которых
+        дольше `timeout` секунд не было ни сигнала воркера, ни хода
+        выполнения (например, воркер был остановлен). Задачи
+        с исчерпанными попытками отмечаются завершёнными с ошибкой.
+        """
+        now = timezone.now()
+        stale = self.filter(
+            status=Job.RUNNING,
+            updated_at__lt=now - timedelta(seconds=timeout)
+        )
+        stale.filter(attempts__gte=models.F('max_attempts')).update(
+            status=Job.FAILED,
+            error='Превышено время выполнения',
+            updated_at=now
+        )
+        return stale.update(status=Job.PENDING, updated_at=now)
+
+    def purge(self, days):
+        """
+        Метод `purge` удаляет завершённые задачи старше `days` дней
+        вместе с файлами результатов.
+        """
+        jobs = self.filter(
+            status__in=(Job.DONE, Job.FAILED),
+            updated_at__lt=timezone.now() - timedelta(days=days)
+        )
+        for name in jobs.exclude(result='').values_list('result', flat=True):
+            job_storage.delete(name)
+        return jobs.delete()
+
+
+class Job(models.Model):
+    """
+    Класс Job для фоновой задачи: формирования pdf-файла списка
+    покупок, импорта, пересчёта счётчиков. Задачи выполняет
+    команда `run_jobs`; неудачные попытки повторяются с растущей
+    задержкой до `max_attempts` раз.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(
+        max_length=100,
+        verbose_name='Задача'
+    )
+    arguments = models.TextField(
+        default='{}',
+        verbose_name='Аргументы (JSON)'
+    )
+    user = models.ForeignKey(
+        AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name='Максимум попыток'
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Выполнено, %'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запустить не раньше'
+    )
+    result = models.FileField(
+        storage=job_storage,
+        blank=True,
+        verbose_name='Результат'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    objects = JobManager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(
+                fields=('status', '-priority', 'run_at'),
+                name='job_queue_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.get_status_display()})'
+
+    def get_arguments(self):
+        """
+        Метод `get_arguments` возвращает аргументы задачи.
+        """
+        return json.loads(self.arguments)
+
+    def set_progress(self, progress):
+        """
+        Метод `set_progress` сохраняет ход выполнения в процентах.
+        Заодно обновляется `updated_at`, по которому зависшие задачи
+        возвращаются в очередь.
+        """
+        self.progress = progress
+        self.save(update_fields=('progress', 'updated_at'))
+
+    def save_result(self, name, content):
+        """
+        Метод `save_result` сохраняет файл результата задачи.
+        """
+        self.result.save(f'{self.pk}-{name}', ContentFile(content), save=False)
+
+    def finish(self):
+        """
+        Метод `finish` отмечает задачу выполненной.
+        """
+        self.status = self.DONE
+        self.progress = 100
+        self.error = ''
+        self.save()
+
+    def fail(self, error):
+        """
+        Метод `fail` возвращает задачу в очередь с задержкой
+        `JOB_RETRY_DELAY` * 2^(попытка - 1) секунд или, если попытки
+        исчерпаны, отмечает её завершённой с ошибкой.
+        """
+        self.error = error
+        if self.attempts < self.max_attempts:
+            self.status = self.PENDING
+            self.run_at = timezone.now() + timedelta(
+                seconds=JOB_RETRY_DELAY * 2 ** (self.attempts - 1)
+            )
+        else:
+            self.status = self.FAILED
+        self.save()
@@ -0,0 +1,45 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from backend.settings import ESTIMATED_COUNT_THRESHOLD
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Класс EstimatedCountPaginator для постраничного вывода больших
+    таблиц в админ-зоне. Для нефильтрованного списка в PostgreSQL
+    число записей берётся из статистики таблицы (`pg_class.reltuples`)
+    вместо COUNT(*) по всей таблице. Небольшие таблицы и
+    отфильтрованные списки считаются точно.
+    """
+    @cached_property
+    def count(self):
+        """
+        Метод `count` возвращает точное или оценочное число записей.
+        """
+        estimate = self.estimated_count()
+        if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+    def estimated_count(self):
+        """
+        Метод `estimated_count` возвращает оценку числа записей
+        нефильтрованного списка или None, если оценка недоступна.
+        """
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where.children or query.combinator:
+            return None
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                (self.object_list.model._meta.db_table,)
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
@@ -0,0 +1,176 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (FavoriteList, Ingredient,  # isort:skip
+                            IngredientInRecipe, Recipe, RecipeActivity,
+                            ShoppingCart, ShoppingListItem, Tag, Tombstone)
+from recipes.tag_index import invalidate_tag_indexes  # isort:skip
+
+SYNC_COLLECTIONS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+    Recipe: 'recipes',
+    FavoriteList: 'favorites',
+    ShoppingCart: 'shopping_cart',
+}
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def shopping_cart_changing(sender, instance, **kwargs):
+    """
+    Функция `shopping_cart_changing` перед изменением записи списка
+    покупок (например, числа порций) вычитает из сводного списка
+    покупок ингредиенты рецепта по сохранённым в базе значениям.
+    """
+    if instance.pk is None:
+        return
+    old = ShoppingCart.objects.filter(pk=instance.pk).values(
+        'recipe_id', 'user_id'
+    ).first()
+    if old is not None:
+        ShoppingListItem.objects.remove_recipe(
+            old['recipe_id'], user_ids=(old['user_id'],)
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, **kwargs):
+    """
+    Функция `shopping_cart_saved` прибавляет ингредиенты рецепта
+    с учётом числа порций к сводному списку покупок пользователя.
+    """
+    ShoppingListItem.objects.add_recipe(
+        instance.recipe_id, user_ids=(instance.user_id,)
+    )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    """
+    Функция `shopping_cart_removed` вычитает ингредиенты
+    рецепта из сводного списка покупок пользователя.
+    Вызывается до удаления, чтобы при каскадном удалении
+    рецепта его ингредиенты ещё были доступны.
+    """
+    ShoppingListItem.objects.remove_recipe(
+        instance.recipe_id, user_ids=(instance.user_id,)
+    )
+
+
+@receiver(post_save, sender=FavoriteList)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added(sender, instance, created, **kwargs):
+    """
+    Функция `recipe_added` повышает популярность рецепта
+    при добавлении в избранное или список покупок.
+    """
+    if created:
+        RecipeActivity.objects.track(instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=FavoriteList)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_removed(sender, instance, **kwargs):
+    """
+    Функция `recipe_removed` понижает популярность рецепта
+    при удалении из избранного или списка покупок.
+    """
+    RecipeActivity.objects.track(instance.recipe_id, -1)
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def recipe_ingredient_moving(sender, instance, **kwargs):
+    """
+    Функция `recipe_ingredient_moving` переносит ингредиент в числе
+    ингредиентов рецептов, если запись перенесена в другой рецепт.
+    """
+    if instance.pk is None:
+        return
+    old = IngredientInRecipe.objects.filter(pk=instance.pk).values_list(
+        'recipe_id', flat=True
+    ).first()
+    if old is not None and old != instance.recipe_id:
+        Recipe.objects.filter(pk=old).update(
+            ingredient_count=F('ingredient_count') - 1
+        )
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            ingredient_count=F('ingredient_count') + 1
+        )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_added(sender, instance, created, **kwargs):
+    """
+    Функция `recipe_ingredient_added` увеличивает число
+    ингредиентов рецепта при добавлении ингредиента.
+    """
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            ingredient_count=F('ingredient_count') + 1
+        )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_removed(sender, instance, **kwargs):
+    """
+    Функция `recipe_ingredient_removed` уменьшает число
+    ингредиентов рецепта при удалении ингредиента, в том числе
+    каскадном при удалении самого ингредиента.
+    """
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        ingredient_count=F('ingredient_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=FavoriteList)
+@receiver(post_delete, sender=ShoppingCart)
+def object_deleted(sender, instance, **kwargs):
+    """
+    Функция `object_deleted` записывает удаление объекта
+    для синхронизации клиентов. Избранное и список покупок
+    записываются по id рецепта для их пользователя.
+    """
+    Tombstone.objects.create(
+        collection=SYNC_COLLECTIONS[sender],
+        object_id=getattr(instance, 'recipe_id', instance.pk),
+        user_id=getattr(instance, 'user_id', None)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Функция `recipe_tags_changed` сбрасывает кэшированные списки
+    рецептов тэгов при изменении тэгов рецепта.
+    """
+    if action in ('post_add', 'post_remove'):
+        tag_ids = (instance.pk,) if reverse else pk_set
+    elif action == 'pre_clear':
+        tag_ids = (instance.pk,) if reverse else list(
+            instance.tags.values_list('id', flat=True)
+        )
+    else:
+        return
+    invalidate_tag_indexes(tag_ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """
+    Функция `recipe_deleting` сбрасывает кэшированные списки
+    рецептов тэгов удаляемого рецепта.
+    """
+    invalidate_tag_indexes(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """
+    Функция `tag_deleted` удаляет кэшированный список рецептов тэга.
+    """
+    invalidate_tag_indexes((instance.pk,))
@@ -0,0 +1,139 @@
+import time
+from array import array
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.settings import TAG_INDEX_CHUNK_SIZE, TAG_INDEX_TIMEOUT
+from recipes.models import Recipe  # isort:skip
+
+TAG_INDEX_PREFIX = 'tag_recipes'
+
+
+def tag_version_key(tag_id):
+    """
+    Функция `tag_version_key` возвращает ключ кэша версии
+    списка рецептов тэга.
+    """
+    return f'{TAG_INDEX_PREFIX}:version:{tag_id}'
+
+
+def get_tag_versions(tag_ids):
+    """
+    Функция `get_tag_versions` возвращает версии тэгов `tag_ids`.
+    Тэгу без версии в кэше назначается новая.
+    """
+    keys = [tag_version_key(tag_id) for tag_id in tag_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def build_tag_index(tag_ids):
+    """
+    Функция `build_tag_index` возвращает id рецептов, отмеченных
+    хотя бы одним из тэгов `tag_ids`, от новых к старым как
+    `array('q')`. Индекс строится по основной базе: в реплике
+    может ещё не быть изменений, из-за которых он был сброшен.
+    """
+    return array('q', Recipe.objects.using('default').filter(
+        id__in=Recipe.tags.through.objects.using('default').filter(
+            tag_id__in=tag_ids
+        ).values('recipe_id')
+    ).order_by('-pub_date', '-id').values_list('id', flat=True).iterator())
+
+
+class TagIndex:
+    """
+    Класс TagIndex для списка id рецептов набора тэгов, который
+    хранится в кэше частями по `TAG_INDEX_CHUNK_SIZE` id: ключ
+    набора хранит число рецептов, а срез читает только нужные
+    части. Ключ включает версии тэгов, поэтому после изменения
+    тэга старые списки больше не читаются и истекают по
+    `TAG_INDEX_TIMEOUT`. Используется пагинатором вместо
+    queryset.
+    """
+    def __init__(self, tag_ids):
+        self.tag_ids = sorted(tag_ids)
+        self.key = f'{TAG_INDEX_PREFIX}:' + ','.join(
+            f'{tag_id}.{version}' for tag_id, version in zip(
+                self.tag_ids, get_tag_versions(self.tag_ids)
+            )
+        )
+        self.count = cache.get(self.key)
+        self.index = None
+
+    def chunk_key(self, number):
+        return f'{self.key}:{number}'
+
+    def build(self):
+        """
+        Метод `build` строит список из базы и сохраняет его в кэш.
+        Возвращает False, если кэш сохранил не все части.
+        """
+        self.index = build_tag_index(self.tag_ids)
+        self.count = len(self.index)
+        chunks = {
+            self.chunk_key(number): self.index[
+                start:start + TAG_INDEX_CHUNK_SIZE
+            ].tobytes()
+            for number, start in enumerate(
+                range(0, self.count, TAG_INDEX_CHUNK_SIZE)
+            )
+        }
+        if cache.set_many(chunks, TAG_INDEX_TIMEOUT):
+            return False
+        return not cache.set_many({self.key: self.count}, TAG_INDEX_TIMEOUT)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        start, stop, _ = item.indices(self.count)
+        if start >= stop:
+            return []
+        if self.index is not None:
+            return self.index[start:stop].tolist()
+        numbers = range(
+            start // TAG_INDEX_CHUNK_SIZE,
+            (stop - 1) // TAG_INDEX_CHUNK_SIZE + 1
+        )
+        cached = cache.get_many([self.chunk_key(n) for n in numbers])
+        if len(cached) < len(numbers):
+            # Часть вытеснена из кэша: список строится заново.
+            self.build()
+            return self.index[start:stop].tolist()
+        ids = array('q')
+        for number in numbers:
+            ids.frombytes(cached[self.chunk_key(number)])
+        offset = numbers[0] * TAG_INDEX_CHUNK_SIZE
+        return ids[start - offset:stop - offset].tolist()
+
+
+def tag_recipe_ids(tag_ids):
+    """
+    Функция `tag_recipe_ids` возвращает id рецептов, отмеченных хотя бы
+    одним из тэгов, от новых к старым как `TagIndex`, или None, если
+    список не удалось сохранить в кэш.
+    """
+    index = TagIndex(tag_ids)
+    if index.count is None and not index.build():
+        return None
+    return index
+
+
+def invalidate_tag_indexes(tag_ids):
+    """
+    Функция `invalidate_tag_indexes` после фиксации транзакции
+    меняет версии тэгов; списки с этими тэгами будут построены
+    заново при следующем запросе.
+    """
+    keys = [tag_version_key(tag_id) for tag_id in tag_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            dict.fromkeys(keys, time.time_ns()), None
+        ))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from recipes.paginators import EstimatedCountPaginator  # isort:skip
 from users.models import CustomUser  # isort:skip
 
 
@@ -9,5 +10,7 @@ class CustomUserAdmin(admin.ModelAdmin):
     Класс CustomUserAdmin для редактирования
     модели CustomUser в интерфейсе админ-зоны.
     """
-    list_dispaly = ('__all__',)
-    search_fields = ('email', 'username')
+    list_display = ('username', 'email', 'first_name', 'last_name')
+    search_fields = ('email__istartswith', 'username__istartswith')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+INDEXES = {
+    'customuser_username_upper_idx': 'username',
+    'customuser_email_upper_idx': 'email',
+}
+
+
+def create_upper_indexes(apps, schema_editor):
+    """
+    Функция `create_upper_indexes` создаёт индексы по UPPER(username)
+    и UPPER(email) для поиска пользователей без учёта регистра
+    по началу имени и почты (`__istartswith`) в админ-зоне.
+    Индексы по выражениям создаются только в PostgreSQL.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "users_customuser" '
+            f'(UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_upper_indexes(apps, schema_editor):
+    """
+    Функция `drop_upper_indexes` удаляет индексы по UPPER(username)
+    и UPPER(email).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_upper_indexes, drop_upper_indexes),
+    ]